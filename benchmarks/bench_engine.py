@@ -0,0 +1,293 @@
+"""
+Benchmark suite: engine hot paths, with a baseline to compare against.
+
+Cases: Deck.reset, Deck.deal, Hand.calculate_value, Game.to_dict,
+Game.to_db_model, Game.from_db_model, a full round (place_bet,
+player_action, new_round) and a round plus the dirty columns of its save.
+Inputs are seeded, so every run times the same work.
+
+What is compared is not a raw time but each case's time relative to a
+reference workload (small dicts and lists, sorting, calls: the same kind of
+work as the engine) timed right before and after every timed run of every
+case, in the same process: a slow spell of the machine hits both sides of
+the ratio and cancels out. Within a run, a case's figure is the median of
+its ratios over --repeat passes; the suite runs --runs times, each in a
+fresh interpreter (memory layout and hash seeds change between processes),
+and the median over the runs is what is saved and compared. The raw
+microseconds (best timed run) are printed for reference only.
+
+benchmarks/baseline.json is the committed reference. Refresh it with
+--save after a change that is meant to move the numbers; --compare exits
+with status 1 if any case got more than --threshold percent slower. Each
+report also records the noise: the largest deviation of a run from the
+median, per case. Comparisons across machines are still only rough.
+
+Usage:
+    python benchmarks/bench_engine.py [--only deal,to_dict] [--repeat 5] [--runs 3]
+    python benchmarks/bench_engine.py --save benchmarks/baseline.json
+    python benchmarks/bench_engine.py --compare benchmarks/baseline.json [--threshold 15]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import CONFIG, Card, Deck, Game, GameStatus, Hand, PlayerAction, Suit, TRAMPAS
+from models import GameModel, StatsModel
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def build_game() -> Game:
+    """A mid-hand game with every cheat unlocked (the heaviest state)"""
+    random.seed(7)
+    game = Game("bench", "Bench", "normal")
+    for cheat_id in TRAMPAS:
+        game.inventory.unlock_cheat(cheat_id)
+    game.inventory.add_item("gafas_oscuras")
+    while game.status != GameStatus.PLAYER_TURN:
+        game.new_round() if game.status != GameStatus.WAITING_FOR_BET else game.place_bet(10)
+    return game
+
+
+def case_deck_reset() -> Callable:
+    deck = Deck(seed=7)
+    return lambda: deck.reset(CONFIG["deck_count"])
+
+
+def case_deck_deal() -> Callable:
+    # Reshuffles every ~290 cards, as in play, so the cost is amortized in
+    deck = Deck(seed=7)
+    return deck.deal
+
+
+def case_calculate_value() -> Callable:
+    hand = Hand()
+    for rank in ["A", "2", "A", "3", "4"]:
+        hand.add_card(Card.face(rank, Suit.HEARTS).at(f"{rank}-bench"))
+    return hand.calculate_value
+
+
+def case_to_dict() -> Callable:
+    return build_game().to_dict
+
+
+def case_to_db_model() -> Callable:
+    return build_game().to_db_model
+
+
+def case_from_db_model() -> Callable:
+    # The ORM rows are built once: what is timed is the restore itself
+    game = build_game()
+    row, stats = GameModel(**game.to_db_model()), StatsModel(**game.stats_dict())
+    return lambda: Game.from_db_model(row, stats)
+
+
+def _round_player() -> Tuple[Game, Callable]:
+    random.seed(7)
+    game = Game("bench", "Bench", "normal")
+
+    def play_round():
+        # Topped up every round so the game never ends
+        game.player_chips = 1000
+        game.stress = 0
+        game.place_bet(10)
+        if game.status == GameStatus.PLAYER_TURN:
+            game.player_action(PlayerAction.STAND)
+        game.new_round()
+
+    return game, play_round
+
+
+def case_round() -> Callable:
+    return _round_player()[1]
+
+
+def case_round_save() -> Callable:
+    # What a request pays: the round plus the dirty columns for the UPDATE
+    game, play_round = _round_player()
+    game.mark_clean()
+
+    def round_and_save():
+        play_round()
+        game.dirty_fields()
+        game.dirty_stats()
+        game.mark_clean()
+
+    return round_and_save
+
+
+CASES: Dict[str, Callable[[], Callable]] = {
+    "deck_reset": case_deck_reset,
+    "deal": case_deck_deal,
+    "calculate_value": case_calculate_value,
+    "to_dict": case_to_dict,
+    "to_db_model": case_to_db_model,
+    "from_db_model": case_from_db_model,
+    "round": case_round,
+    "round_save": case_round_save,
+}
+
+
+def _reference():
+    """Fixed pure-Python work that tracks how fast the machine is right now
+    for the engine's kind of code (dicts, lists, sorting, small calls)"""
+    rows = []
+    for i in range(100):
+        rows.append({"id": i, "value": i * 7 % 13, "name": str(i)})
+    rows.sort(key=lambda row: row["value"])
+    return sum(row["value"] for row in rows)
+
+
+def _calibrate(fn: Callable, target: float = 0.02) -> int:
+    """Calls per timed run so that one run takes about target seconds"""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(fn, number=number)
+        if elapsed >= target:
+            return number
+        number = max(number * 2, int(number * target / max(elapsed, 1e-9)))
+
+
+def run_suite(names: List[str], repeat: int) -> Dict:
+    """Best-of-repeat mean microseconds per call for each case, and the
+    median over the repeats of its time relative to the reference workload.
+
+    Every pass goes round-robin over the cases with the reference timed
+    between them, so each run of a case is bracketed by two reference runs
+    taken under the same machine load.
+    """
+    fns = {name: CASES[name]() for name in names}
+    numbers = {name: _calibrate(fn) for name, fn in fns.items()}
+    reference_number = _calibrate(_reference)
+
+    def time_reference() -> float:
+        return timeit.timeit(_reference, number=reference_number) / reference_number
+
+    best = {name: float("inf") for name in fns}
+    ratios: Dict[str, List[float]] = {name: [] for name in fns}
+    best_reference = float("inf")
+    for _ in range(repeat):
+        before = time_reference()
+        for name, fn in fns.items():
+            elapsed = timeit.timeit(fn, number=numbers[name]) / numbers[name]
+            after = time_reference()
+            best[name] = min(best[name], elapsed)
+            ratios[name].append(elapsed / ((before + after) / 2))
+            best_reference = min(best_reference, before)
+            before = after
+    return {
+        "reference_us": best_reference * 1e6,
+        "results_us": {name: best[name] * 1e6 for name in names},
+        "relative": {name: statistics.median(ratios[name]) for name in names},
+    }
+
+
+def run_isolated(names: List[str], repeat: int, runs: int) -> Dict:
+    """run_suite() in runs fresh interpreters, merged: the median of the
+    relative times, the best raw times, and the noise of each case (largest
+    deviation of a run from the median, in percent)"""
+    reports = []
+    for _ in range(runs):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--only", ",".join(names), "--repeat", str(repeat), "--json"],
+            check=True, capture_output=True, text=True,
+        )
+        reports.append(json.loads(child.stdout))
+
+    relative, noise = {}, {}
+    for name in names:
+        values = [report["relative"][name] for report in reports]
+        relative[name] = statistics.median(values)
+        noise[name] = max(abs(value / relative[name] - 1) for value in values) * 100
+    return {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "runs": runs,
+        "reference_us": round(min(report["reference_us"] for report in reports), 4),
+        "results_us": {name: round(min(report["results_us"][name] for report in reports), 4) for name in names},
+        "relative": {name: round(value, 6) for name, value in relative.items()},
+        "noise_pct": {name: round(value, 1) for name, value in noise.items()},
+    }
+
+
+def compare(baseline: Dict, report: Dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """Lines of the comparison table and the cases that regressed.
+
+    Changes are those of each case's time relative to the reference
+    workload, so a machine that is slower as a whole (another load, another
+    CPU) does not show up as a regression of every case.
+    """
+    lines, regressions = [], []
+    for name, us in report["results_us"].items():
+        old = baseline["results_us"].get(name)
+        old_relative = baseline.get("relative", {}).get(name)
+        noise = report["noise_pct"][name]
+        if old is None or old_relative is None:
+            lines.append(f"{name:18} {'-':>10} {us:10.3f}        new {noise:6.1f}%")
+            continue
+        change = (report["relative"][name] - old_relative) / old_relative * 100
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        lines.append(f"{name:18} {old:10.3f} {us:10.3f} {change:+9.1f}% {noise:6.1f}%{flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine hot path benchmarks")
+    parser.add_argument("--only", help="comma-separated cases: " + ",".join(CASES))
+    parser.add_argument("--repeat", type=int, default=5, help="passes over the cases per run")
+    parser.add_argument("--runs", type=int, default=3, help="runs, each in a fresh interpreter")
+    parser.add_argument("--save", nargs="?", const=BASELINE_PATH, help="write the results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, help="baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=15.0, help="allowed slowdown per case, in percent")
+    # One run of a --runs suite: prints run_suite() as JSON
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    if args.json:
+        print(json.dumps(run_suite(names, args.repeat)))
+        return
+
+    report = run_isolated(names, args.repeat, args.runs)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, report, args.threshold)
+        print(f"reference workload: {baseline['reference_us']:.3f} us -> {report['reference_us']:.3f} us")
+        print(f"{'case':18} {'baseline':>10} {'now':>10} {'change':>10} {'noise':>7}   (us per call, change relative to the reference)")
+        print("\n".join(lines))
+        if regressions:
+            print(f"\nmore than {args.threshold:g}% slower: {', '.join(regressions)}")
+    else:
+        for name, us in report["results_us"].items():
+            print(f"{name:18} {us:10.3f} us   noise {report['noise_pct'][name]:.1f}%")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.save}")
+
+    if args.compare and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: hand evaluation.
+
+Times Hand.calculate_value(), add_card() (which re-checks bust and
+blackjack), remove_worst_card() on a busted hand and a full dealer turn,
+next to a plain re-sum of the cards (what calculate_value() used to do on
+every call) as the reference.
+
+Usage:
+    python benchmarks/bench_hand.py [--iterations 100000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import CONFIG, Card, Hand, Suit
+
+
+def card(rank: str) -> Card:
+    return Card.face(rank, Suit.HEARTS).at(f"{rank}-bench")
+
+
+def resum_value(cards) -> int:
+    """Reference: sum every card and take aces back one by one"""
+    value = sum(c.value() for c in cards)
+    aces = sum(1 for c in cards if c.rank == 'A')
+    while value > 21 and aces > 0:
+        value -= 10
+        aces -= 1
+    return value
+
+
+def build_hand(cards) -> Hand:
+    hand = Hand()
+    for c in cards:
+        hand.add_card(c)
+    return hand
+
+
+def timed(fn, iterations: int) -> float:
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hand evaluation benchmark")
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    soft_hand = build_hand([card(r) for r in ["A", "2", "A", "3", "4"]])
+    busted_cards = [card(r) for r in ["K", "A", "5", "Q", "3", "2"]]
+    upcard = [card("6")]
+    dealer_draws = [card(r) for r in ["2", "A", "3", "2", "A", "4"]]
+
+    def add_cards():
+        build_hand(busted_cards)
+
+    def swap_worst():
+        build_hand(busted_cards).remove_worst_card()
+
+    def dealer_turn():
+        # What _dealer_play does: evaluate the hand on every loop iteration
+        hand = build_hand(upcard)
+        draws = iter(dealer_draws)
+        while hand.calculate_value() < CONFIG["dealer_stand_value"]:
+            hand.add_card(next(draws))
+        return hand.calculate_value()
+
+    print(f"re-sum of 5 cards (reference)      {timed(lambda: resum_value(soft_hand.cards), n):8.2f} us")
+    print(f"Hand.calculate_value() (5 cards)   {timed(soft_hand.calculate_value, n):8.2f} us")
+    print(f"build a 6-card hand (add_card)     {timed(add_cards, n // 10):8.2f} us")
+    print(f"build + remove_worst_card()        {timed(swap_worst, n // 10):8.2f} us")
+    print(f"dealer turn (6 -> 17+)             {timed(dealer_turn, n // 10):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
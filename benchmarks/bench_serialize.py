@@ -0,0 +1,65 @@
+"""
+Benchmark: time to turn a game into the response body.
+
+Compares FastAPI's generic path (jsonable_encoder + JSONResponse) with the
+direct FastJSONResponse (orjson) path, on top of Game.to_dict().
+
+Usage:
+    python benchmarks/bench_serialize.py [--iterations 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+# No database needed: the engines are created but never connected
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ASYNC_DATABASE_URL", "sqlite+aiosqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from engine import Game, GameStatus, TRAMPAS
+from main import FastJSONResponse
+
+
+def build_game() -> Game:
+    """A mid-hand game with every cheat unlocked (the heaviest to_dict())"""
+    game = Game("bench", "Bench", "normal")
+    for cheat_id in TRAMPAS:
+        game.inventory.unlock_cheat(cheat_id)
+    game.inventory.add_item("gafas_oscuras")
+    while game.status != GameStatus.PLAYER_TURN:
+        game.new_round() if game.status != GameStatus.WAITING_FOR_BET else game.place_bet(10)
+    return game
+
+
+def timed(fn, iterations: int) -> float:
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialize-time benchmark")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    game = build_game()
+    state = game.to_dict()
+
+    to_dict_us = timed(game.to_dict, args.iterations)
+    generic_us = timed(lambda: JSONResponse(jsonable_encoder(state)), args.iterations)
+    fast_us = timed(lambda: FastJSONResponse(state), args.iterations)
+
+    print(f"to_dict()                          {to_dict_us:8.1f} us")
+    print(f"jsonable_encoder + JSONResponse    {generic_us:8.1f} us")
+    print(f"FastJSONResponse (orjson)          {fast_us:8.1f} us")
+    print(f"per request: {to_dict_us + generic_us:.1f} us -> {to_dict_us + fast_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
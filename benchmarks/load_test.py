@@ -0,0 +1,241 @@
+"""
+Load test: concurrent virtual players drive full sessions through the HTTP API.
+
+Each virtual player creates a game, plays --rounds rounds (bet, the odd
+cheat, hit/stand, new-round, advance-garito, buy-item and leave-shop when a
+garito is cleared) and deletes the game. Requests go to the ASGI app
+in-process through httpx's ASGITransport, so what is measured is the app
+and its database, not a server or the network.
+
+The database is a throwaway SQLite file unless DATABASE_URL and
+ASYNC_DATABASE_URL are set (e.g. to the MariaDB of docker compose).
+
+Report: requests per second, and per endpoint the count, errors, p50/p95/p99
+latency and SQL statements per request (DB round trips, from the
+X-DB-Queries header). --save writes it
+as JSON; --compare prints the change against a saved report and exits with
+status 1 if any endpoint's p95 got more than --tolerance percent slower.
+
+Usage:
+    python benchmarks/load_test.py [--players 50] [--sessions 2] [--rounds 20] [--save load.json]
+    python benchmarks/load_test.py --compare load.json [--tolerance 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Throwaway SQLite database unless a real one is configured
+_db_path = os.path.join(tempfile.mkdtemp(prefix="bj-load-"), "load.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_path}")
+os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{_db_path}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from main import app, shutdown_event, startup_event
+from database import ASYNC_DATABASE_URL, get_async_engine
+from engine import ITEMS
+
+
+class Recorder:
+    """Latency and statement count of every request, by endpoint"""
+
+    def __init__(self):
+        self.samples: Dict[str, List] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, endpoint: str, seconds: float, statements: int, ok: bool):
+        self.samples.setdefault(endpoint, []).append((seconds, statements))
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+class VirtualPlayer:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, cheat_rate: float):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.cheat_rate = cheat_rate
+
+    async def call(self, method: str, route: str, game_id: str = "", **kwargs) -> Dict:
+        """One request, recorded under its route template ("POST /games/{game_id}/bet")"""
+        start = time.perf_counter()
+        response = await self.client.request(method, route.format(game_id=game_id), **kwargs)
+        elapsed = time.perf_counter() - start
+        statements = int(response.headers.get("x-db-queries", 0))
+        self.recorder.add(f"{method} {route}", elapsed, statements, response.is_success)
+        response.raise_for_status()
+        return response.json()
+
+    async def play_session(self, rounds: int, difficulty: str):
+        created = await self.call("POST", "/games", json={"player_name": "Load", "difficulty": difficulty})
+        game_id = created["game_id"]
+        state = await self.call("GET", "/games/{game_id}", game_id)
+
+        for _ in range(rounds):
+            if state["status"] == "shop":
+                budget = state["player_chips"] // 2
+                affordable = [item_id for item_id, item in ITEMS.items() if item["price"] <= budget]
+                if affordable:
+                    await self.call("POST", "/games/{game_id}/buy-item", game_id, json={"item_id": self.rng.choice(affordable)})
+                state = await self.call("POST", "/games/{game_id}/leave-shop", game_id)
+
+            state = await self.call("POST", "/games/{game_id}/bet", game_id, json={"amount": state["garito"]["min_bet"]})
+            cheated = False
+            while state["status"] == "player_turn":
+                usable = [cheat["id"] for cheat in state["available_cheats"] if cheat["can_use"]]
+                if usable and not cheated and self.rng.random() < self.cheat_rate:
+                    cheated = True
+                    result = await self.call("POST", "/games/{game_id}/cheat", game_id, json={"cheat_id": self.rng.choice(usable)})
+                    state = result["game_state"]
+                    continue
+                action = "hit" if state["player_hand"]["value"] < 17 else "stand"
+                state = await self.call("POST", "/games/{game_id}/action", game_id, json={"action": action})
+
+            if state["status"] == "game_over":
+                break
+            if state["can_advance_garito"]:
+                result = await self.call("POST", "/games/{game_id}/advance-garito", game_id)
+                state = result["game_state"]
+            else:
+                state = await self.call("POST", "/games/{game_id}/new-round", game_id)
+
+        await self.call("DELETE", "/games/{game_id}", game_id)
+
+
+async def run_load(players: int, sessions: int, rounds: int, difficulty: str, cheat_rate: float, seed: int) -> Dict:
+    await startup_event()
+    recorder = Recorder()
+    failed_sessions = 0
+
+    async def virtual_player(index: int):
+        nonlocal failed_sessions
+        player = VirtualPlayer(client, recorder, random.Random(seed * 1_000_003 + index), cheat_rate)
+        for _ in range(sessions):
+            try:
+                await player.play_session(rounds, difficulty)
+            except httpx.HTTPStatusError:
+                failed_sessions += 1
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(virtual_player(i) for i in range(players)))
+            elapsed = time.perf_counter() - start
+    finally:
+        await shutdown_event()
+        await get_async_engine().dispose()
+
+    return build_report(recorder, elapsed, {
+        "players": players,
+        "sessions": sessions,
+        "rounds": rounds,
+        "difficulty": difficulty,
+        "cheat_rate": cheat_rate,
+        "seed": seed,
+        "database": ASYNC_DATABASE_URL.split(":", 1)[0],
+        "failed_sessions": failed_sessions,
+    })
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def build_report(recorder: Recorder, elapsed: float, config: Dict) -> Dict:
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = [seconds * 1000 for seconds, _ in samples]
+        statements = [count for _, count in samples]
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": recorder.errors.get(endpoint, 0),
+            "p50_ms": round(_percentile(latencies, 0.50), 3),
+            "p95_ms": round(_percentile(latencies, 0.95), 3),
+            "p99_ms": round(_percentile(latencies, 0.99), 3),
+            "db_round_trips": round(sum(statements) / len(statements), 2),
+            "db_round_trips_max": max(statements),
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "config": config,
+        "duration_s": round(elapsed, 3),
+        "requests": total,
+        "requests_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: Dict):
+    config = report["config"]
+    print(f"{config['players']} players x {config['sessions']} sessions x {config['rounds']} rounds "
+          f"({config['database']}, {config['difficulty']})")
+    print(f"{report['requests']} requests in {report['duration_s']}s: {report['requests_per_second']} req/s, "
+          f"{config['failed_sessions']} failed sessions")
+    print(f"{'endpoint':38} {'n':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/req':>8}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:38} {stats['requests']:6d} {stats['errors']:4d} {stats['p50_ms']:8.2f} "
+              f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['db_round_trips']:8.2f}")
+
+
+def _change(old: float, new: float) -> str:
+    return f"{(new - old) / old * 100:+6.1f}%" if old else "     n/a"
+
+
+def compare_reports(baseline: Dict, report: Dict, tolerance: float) -> List[str]:
+    """Print the change against a baseline; returns the endpoints whose p95 regressed"""
+    print(f"\nvs baseline: req/s {baseline['requests_per_second']} -> {report['requests_per_second']} "
+          f"({_change(baseline['requests_per_second'], report['requests_per_second']).strip()})")
+    print(f"{'endpoint':38} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL/req':>14}")
+    regressions = []
+    for endpoint, stats in report["endpoints"].items():
+        old = baseline["endpoints"].get(endpoint)
+        if old is None:
+            print(f"{endpoint:38} (new)")
+            continue
+        print(f"{endpoint:38} {_change(old['p50_ms'], stats['p50_ms'])} {_change(old['p95_ms'], stats['p95_ms'])} "
+              f"{_change(old['p99_ms'], stats['p99_ms'])} {old['db_round_trips']:6.2f} -> {stats['db_round_trips']:<6.2f}")
+        if old["p95_ms"] and (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > tolerance:
+            regressions.append(endpoint)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the HTTP API")
+    parser.add_argument("--players", type=int, default=50, help="concurrent virtual players")
+    parser.add_argument("--sessions", type=int, default=2, help="games played by each player")
+    parser.add_argument("--rounds", type=int, default=20, help="rounds per game at most")
+    parser.add_argument("--difficulty", default="normal")
+    parser.add_argument("--cheat-rate", type=float, default=0.2, help="chance of cheating once in a hand")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the report as JSON to this path")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="allowed p95 slowdown, in percent")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.players, args.sessions, args.rounds, args.difficulty, args.cheat_rate, args.seed))
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.tolerance)
+        if regressions:
+            print(f"\np95 more than {args.tolerance:g}% slower: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,12 @@
 Database configuration for Blackjack Roguelite
 """
 import os
+import time
+from functools import lru_cache
+from typing import Callable, List
 from sqlalchemy import create_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -13,29 +18,148 @@ DB_USER = os.getenv("DB_USER", "blackjack_user")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "blackjack_pass")
 DB_DATABASE = os.getenv("DB_DATABASE", "blackjack")
 
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
-
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+# Sync URL for scripts (migrations), async URL for the API request path.
+# Both can be overridden, e.g. sqlite:///local.db + sqlite+aiosqlite:///local.db
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}",
+)
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}",
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connection pool sizing (per worker process: size the total against the
+# server's max_connections). pool_recycle stays below MariaDB's wait_timeout,
+# so the extra round trip of pool_pre_ping is off by default.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+
+
+# Called with the seconds each checkout took (metrics.instrument_pool adds
+# the pool wait histogram here)
+pool_wait_observers: List[Callable[[float], None]] = []
+
+
+class _TimedConnect:
+    """Pool mixin timing connect(), the public checkout entry point: waiting
+    for a free connection, or opening one. There is no pool event before the
+    wait starts; as a subclass it survives dispose(), which recreates the pool
+    with the same class."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            elapsed = time.perf_counter() - start
+            for observer in pool_wait_observers:
+                observer(elapsed)
+
+
+class TimedQueuePool(_TimedConnect, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedConnect, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(url: str, asyncio: bool = False) -> dict:
+    """Engine pool arguments; SQLite stand-ins keep SQLAlchemy's own pooling"""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if asyncio else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
 
 Base = declarative_base()
 
+# Engines and session factories are built on first use, so importing this
+# module (or models) loads no DB driver and opens no pool. The old
+# module-level names (engine, SessionLocal, async_engine, AsyncSessionLocal)
+# still work through __getattr__.
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    return create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
+
+
+@lru_cache(maxsize=None)
+def get_session_factory():
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@lru_cache(maxsize=None)
+def get_async_engine():
+    return create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, asyncio=True))
+
+
+@lru_cache(maxsize=None)
+def get_async_session_factory():
+    return async_sessionmaker(
+        get_async_engine(),
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+_LAZY_NAMES = {
+    "engine": get_engine,
+    "SessionLocal": get_session_factory,
+    "async_engine": get_async_engine,
+    "AsyncSessionLocal": get_async_session_factory,
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_NAMES:
+        return _LAZY_NAMES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def dispose_engines():
+    """Drop pooled connections inherited from a parent process (after fork)"""
+    if get_engine.cache_info().currsize:
+        get_engine().dispose(close=False)
+    if get_async_engine.cache_info().currsize:
+        get_async_engine().sync_engine.dispose(close=False)
+
 
 def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
+    db = get_session_factory()()
     try:
         yield db
     finally:
         db.close()
 
 
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with get_async_session_factory()() as db:
+        yield db
+
+
 def init_db():
     """Initialize database tables"""
     from models import GameModel, StatsModel
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+
+
+async def init_db_async():
+    """Initialize database tables through the async engine"""
+    from models import GameModel, StatsModel
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
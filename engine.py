@@ -0,0 +1,1856 @@
+"""
+Game engine for Blackjack Roguelite: rules, cards, hands, inventory and Game.
+
+Depends only on the standard library (odds.py and strategy.py do too), so
+simulators, workers and scripts can import it in milliseconds without
+FastAPI, SQLAlchemy or a database. main.py layers the API and persistence
+on top.
+"""
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from enum import Enum
+from functools import lru_cache
+import os
+import random
+import base64
+import struct
+
+from odds import rank_counts, dealer_distribution, dealer_blackjack_chance, bust_chance
+from strategy import strategy_tables, garito_rules
+
+if TYPE_CHECKING:
+    from models import GameModel, StatsModel
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURACIÓN BASE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+CONFIG = {
+    "deck_count": 6,
+    "dealer_stand_value": 17,
+    "blackjack_payout": 1.5,
+    "starting_chips": 500,
+    "minimum_bet": 10,
+    "maximum_bet": 500,
+    "starting_stress": 0,
+    "max_stress": 100,
+}
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SISTEMA DE DIFICULTAD
+# ═══════════════════════════════════════════════════════════════════════════════
+
+DIFFICULTY_SETTINGS = {
+    "easy": {
+        "name": "Novato",
+        "description": "Para los que empiezan en el juego",
+        "icon": "🌟",
+        "starting_chips": 750,
+        "starting_stress": 0,
+        "stress_gain_loss": 2,           # Estrés ganado al perder
+        "stress_gain_detected": 10,      # Estrés ganado al ser detectado
+        "stress_reduction_win": 8,       # Estrés reducido al ganar
+        "detection_modifier": -0.10,     # -10% detección base
+        "win_streak_multipliers": {      # Multiplicadores de racha
+            2: 1.5,   # 2 victorias = x1.5
+            3: 2.0,   # 3 victorias = x2
+            4: 3.0,   # 4 victorias = x3
+            5: 5.0,   # 5+ victorias = x5
+        },
+        "blackjack_streak_bonus": 1.5,   # Bonus extra si BJ en racha
+        "base_streak_multiplier": 1.0,   # Multiplicador base de racha
+    },
+    "normal": {
+        "name": "Tahur",
+        "description": "El modo clasico",
+        "icon": "🎰",
+        "starting_chips": 500,
+        "starting_stress": 10,
+        "stress_gain_loss": 3,
+        "stress_gain_detected": 15,
+        "stress_reduction_win": 5,
+        "detection_modifier": 0,
+        "win_streak_multipliers": {
+            2: 2.0,   # 2 victorias = x2
+            3: 3.0,   # 3 victorias = x3
+            4: 4.0,   # 4 victorias = x4
+            5: 10.0,  # 5+ victorias = x10
+        },
+        "blackjack_streak_bonus": 2.0,
+        "base_streak_multiplier": 1.0,
+    },
+    "hard": {
+        "name": "Suicida",
+        "description": "Solo para los mas temerarios",
+        "icon": "💀",
+        "starting_chips": 300,
+        "starting_stress": 25,
+        "stress_gain_loss": 5,
+        "stress_gain_detected": 20,
+        "stress_reduction_win": 3,
+        "detection_modifier": 0.10,      # +10% detección base
+        "win_streak_multipliers": {
+            2: 2.5,   # 2 victorias = x2.5
+            3: 4.0,   # 3 victorias = x4
+            4: 6.0,   # 4 victorias = x6
+            5: 15.0,  # 5+ victorias = x15
+        },
+        "blackjack_streak_bonus": 3.0,
+        "base_streak_multiplier": 1.0,
+    },
+}
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SISTEMA DE GARITOS (OLEADAS)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+GARITOS = {
+    1: {
+        "name": "El Callejón de los Desahuciados",
+        "description": "Donde empiezan los perdedores",
+        "dealer_name": "Manco Pete",
+        "dealer_personality": "distraído",
+        "dealer_image": "/images/croupier-1.jpg",
+        "chips_to_advance": 1000,
+        "min_bet": 10,
+        "max_bet": 100,
+        "cheat_detection_base": 0.15,  # 15% base de detección
+        "special_rules": [],
+        "color": "#33ff33",
+        "unlocks": ["peek_card"],  # Trampa que desbloqueas al ganar
+    },
+    2: {
+        "name": "La Taberna del Tuerto",
+        "description": "Los borrachos apuestan fuerte",
+        "dealer_name": "Sally la Sorda",
+        "dealer_personality": "lenta",
+        "dealer_image": "/images/croupier-2.jpg",
+        "chips_to_advance": 2500,
+        "min_bet": 25,
+        "max_bet": 250,
+        "cheat_detection_base": 0.25,
+        "special_rules": ["drunk_bonus"],  # +10% en victorias
+        "color": "#ffaa00",
+        "unlocks": ["swap_card"],
+    },
+    3: {
+        "name": "El Salón Dorado",
+        "description": "Aquí juegan los que tienen algo que perder",
+        "dealer_name": "Don Rodrigo",
+        "dealer_personality": "observador",
+        "dealer_image": "/images/croupier-3.jpg",
+        "chips_to_advance": 5000,
+        "min_bet": 50,
+        "max_bet": 500,
+        "cheat_detection_base": 0.35,
+        "special_rules": ["high_roller"],  # Doblar paga 2.5x
+        "color": "#ffd700",
+        "unlocks": ["extra_card"],
+    },
+    4: {
+        "name": "La Casa de la Viuda Negra",
+        "description": "Muchos entran, pocos salen con sus fichas",
+        "dealer_name": "La Viuda",
+        "dealer_personality": "despiadada",
+        "dealer_image": "/images/croupier-4.jpg",
+        "chips_to_advance": 10000,
+        "min_bet": 100,
+        "max_bet": 1000,
+        "cheat_detection_base": 0.45,
+        "special_rules": ["widow_curse"],  # Empates son derrotas
+        "color": "#ff0066",
+        "unlocks": ["mark_deck"],
+    },
+    5: {
+        "name": "El Infierno de Dante",
+        "description": "El garito final. Todo o nada.",
+        "dealer_name": "El Diablo",
+        "dealer_personality": "omnisciente",
+        "dealer_image": "/images/croupier-5.jpg",
+        "chips_to_advance": None,  # Victoria final
+        "min_bet": 500,
+        "max_bet": 5000,
+        "cheat_detection_base": 0.60,
+        "special_rules": ["devils_game"],  # BJ del dealer = pierdes todo
+        "color": "#ff0000",
+        "unlocks": ["bribe"],
+    },
+}
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SISTEMA DE TRAMPAS (POWER-UPS ACTIVOS)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+TRAMPAS = {
+    "peek_card": {
+        "name": "Espiar Carta Oculta",
+        "description": "Ver la carta oculta del crupier",
+        "icon": "👁️",
+        "stress_cost": 5,
+        "detection_modifier": 0.10,
+        "cooldown": 0,  # Puede usarse cada ronda
+        "effect": "reveal_dealer",
+    },
+    "peek_next_card": {
+        "name": "Espiar Próxima Carta",
+        "description": "Ver la próxima carta que saldrá del mazo",
+        "icon": "🔮",
+        "stress_cost": 15,
+        "detection_modifier": 0.35,  # MUCHO más riesgoso
+        "cooldown": 1,
+        "effect": "peek_next",
+    },
+    "swap_card": {
+        "name": "Cambiar Carta",
+        "description": "Cambia tu peor carta por una del mazo",
+        "icon": "🔄",
+        "stress_cost": 15,
+        "detection_modifier": 0.20,
+        "cooldown": 2,
+        "effect": "swap_worst",
+    },
+    "extra_card": {
+        "name": "Carta Extra",
+        "description": "Roba una carta sin que cuente como Hit",
+        "icon": "🃏",
+        "stress_cost": 20,
+        "detection_modifier": 0.25,
+        "cooldown": 3,
+        "effect": "free_card",
+    },
+    "mark_deck": {
+        "name": "Marcar Mazo",
+        "description": "Ve las próximas 3 cartas del mazo",
+        "icon": "✒️",
+        "stress_cost": 10,
+        "detection_modifier": 0.15,
+        "cooldown": 1,
+        "effect": "see_deck",
+    },
+    "bribe": {
+        "name": "Sobornar",
+        "description": "El crupier 'se equivoca' a tu favor",
+        "icon": "💰",
+        "stress_cost": 25,
+        "detection_modifier": 0.30,
+        "chip_cost": 50,  # Cuesta fichas además de estrés
+        "cooldown": 5,
+        "effect": "dealer_mistake",
+    },
+}
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SISTEMA DE OBJETOS (POWER-UPS PASIVOS/CONSUMIBLES)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+ITEMS = {
+    "whiskey": {
+        "name": "Whiskey Barato",
+        "description": "Reduce 10 de estres",
+        "icon": "🥃",
+        "price": 25,
+        "effect": "reduce_stress",
+        "value": 10,
+        "consumable": True,
+    },
+    "cigarro": {
+        "name": "Cigarro de la Suerte",
+        "description": "La proxima trampa no puede fallar",
+        "icon": "🚬",
+        "price": 75,
+        "effect": "guaranteed_cheat",
+        "consumable": True,
+    },
+    "dado_cargado": {
+        "name": "Dado Cargado",
+        "description": "+5% probabilidad de BJ esta ronda",
+        "icon": "🎲",
+        "price": 100,
+        "effect": "lucky_draw",
+        "consumable": True,
+    },
+    "gafas_oscuras": {
+        "name": "Gafas Oscuras",
+        "description": "-10% deteccion de trampas (permanente)",
+        "icon": "🕶️",
+        "price": 200,
+        "effect": "reduce_detection",
+        "value": 0.10,
+        "consumable": False,
+    },
+    "anillo_sello": {
+        "name": "Anillo con Sello",
+        "description": "+15% ganancias en victorias (permanente)",
+        "icon": "💍",
+        "price": 300,
+        "effect": "bonus_winnings",
+        "value": 0.15,
+        "consumable": False,
+    },
+    "reloj_bolsillo": {
+        "name": "Reloj de Bolsillo",
+        "description": "Una vez por garito: repite la ultima ronda",
+        "icon": "⏱️",
+        "price": 500,
+        "effect": "rewind",
+        "consumable": True,
+        "uses_per_garito": 1,
+    },
+    # NUEVOS: Items multiplicadores de racha
+    "herradura": {
+        "name": "Herradura de la Suerte",
+        "description": "+25% multiplicador de racha (permanente)",
+        "icon": "🧲",
+        "price": 400,
+        "effect": "streak_multiplier",
+        "value": 0.25,
+        "consumable": False,
+    },
+    "trebol": {
+        "name": "Trebol de 4 Hojas",
+        "description": "+50% multiplicador de racha (permanente)",
+        "icon": "🍀",
+        "price": 750,
+        "effect": "streak_multiplier",
+        "value": 0.50,
+        "consumable": False,
+    },
+    "amuleto_diablo": {
+        "name": "Amuleto del Diablo",
+        "description": "Racha no se pierde en empates (permanente)",
+        "icon": "😈",
+        "price": 600,
+        "effect": "streak_on_push",
+        "consumable": False,
+    },
+    "moneda_maldita": {
+        "name": "Moneda Maldita",
+        "description": "x2 bonus de racha pero +5 estres por victoria",
+        "icon": "🪙",
+        "price": 350,
+        "effect": "cursed_streak",
+        "value": 2.0,
+        "consumable": False,
+    },
+}
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FRAGMENTOS PRECALCULADOS DEL ESTADO
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Bloques de Game.to_dict() que solo dependen de la configuración: se
+# construyen una vez al importar y se comparten entre respuestas (no mutarlos)
+GARITO_VIEWS = {
+    level: {
+        "level": level,
+        "name": garito["name"],
+        "description": garito["description"],
+        "dealer_name": garito["dealer_name"],
+        "dealer_image": garito.get("dealer_image", "/images/croupier-1.jpg"),
+        "color": garito["color"],
+        "min_bet": garito["min_bet"],
+        "max_bet": garito["max_bet"],
+        "chips_to_advance": garito.get("chips_to_advance"),
+        "special_rules": garito.get("special_rules", []),
+    }
+    for level, garito in GARITOS.items()
+}
+
+DIFFICULTY_VIEWS = {
+    difficulty: {
+        "id": difficulty,
+        "name": diff["name"],
+        "description": diff["description"],
+        "icon": diff["icon"],
+    }
+    for difficulty, diff in DIFFICULTY_SETTINGS.items()
+}
+
+CHEAT_VIEWS = {
+    cheat_id: {
+        "id": cheat_id,
+        "name": cheat.get("name", cheat_id),
+        "description": cheat.get("description", ""),
+        "icon": cheat.get("icon", "?"),
+        "stress_cost": cheat.get("stress_cost", 0),
+        "chip_cost": cheat.get("chip_cost", 0),
+    }
+    for cheat_id, cheat in TRAMPAS.items()
+}
+
+
+def cheat_view(cheat_id: str) -> Dict:
+    """Parte fija de una trampa en available_cheats"""
+    view = CHEAT_VIEWS.get(cheat_id)
+    if view is None:
+        view = {"id": cheat_id, "name": cheat_id, "description": "", "icon": "?", "stress_cost": 0, "chip_cost": 0}
+    return view
+
+
+@lru_cache(maxsize=4096)
+def detection_chance(garito_level: int, difficulty: str, cheat_id: str, stress: float, reduction: float) -> float:
+    """Probabilidad de ser detectado; pura para poder memorizarla"""
+    garito = GARITOS.get(garito_level, GARITOS[1])
+    cheat = TRAMPAS.get(cheat_id, {})
+    diff = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS["normal"])
+
+    base = garito.get("cheat_detection_base", 0.20)
+    modifier = cheat.get("detection_modifier", 0.10)
+
+    # Modificador de dificultad
+    diff_modifier = diff.get("detection_modifier", 0)
+
+    # El estrés aumenta la detección
+    stress_modifier = stress / 200  # +0.5 máximo por estrés
+
+    final = base + modifier + diff_modifier + stress_modifier - reduction
+    return max(0.05, min(0.95, final))  # Entre 5% y 95%
+
+
+@lru_cache(maxsize=4096)
+def detection_label(garito_level: int, difficulty: str, cheat_id: str, stress: float, reduction: float) -> str:
+    """detection_chance() formateada como en available_cheats ("35%")"""
+    return f"{detection_chance(garito_level, difficulty, cheat_id, stress, reduction)*100:.0f}%"
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REGLAS DE PAGO
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Funciones puras que usa Game y que reutiliza el simulador (simulator.py)
+
+
+def has_rule(garito: Dict, rule: str) -> bool:
+    """¿Aplica el garito esta regla especial?"""
+    return rule in garito.get("special_rules", [])
+
+
+def win_bonus(garito: Dict, passive_effects: Dict) -> float:
+    """Bonus sobre las ganancias de una mano ganada (objetos + drunk_bonus)"""
+    bonus = passive_effects.get("bonus_winnings", 0)
+    if has_rule(garito, "drunk_bonus"):
+        bonus += 0.10
+    return bonus
+
+
+def blackjack_base_payout(bet: int, passive_effects: Dict) -> int:
+    """Ganancia de un blackjack natural antes del bonus de racha"""
+    base_payout = int(bet * CONFIG["blackjack_payout"])
+    bonus = passive_effects.get("bonus_winnings", 0)
+    if bonus > 0:
+        base_payout = int(base_payout * (1 + bonus))
+    return base_payout
+
+
+def streak_multiplier(diff: Dict, win_streak: int, passive_effects: Dict, is_blackjack: bool = False) -> float:
+    """Multiplicador de racha para una victoria que deja la racha en win_streak"""
+    if win_streak < 2:
+        return 1.0
+
+    streak_mults = diff["win_streak_multipliers"]
+
+    # Encontrar el multiplicador correcto
+    streak_key = min(win_streak, 5)  # Máximo nivel es 5
+    base_multiplier = streak_mults.get(streak_key, 1.0)
+
+    # Aplicar modificadores de items
+    item_streak_bonus = passive_effects.get("streak_multiplier", 0)
+    cursed_bonus = passive_effects.get("cursed_streak", 0)
+
+    # Calcular multiplicador final
+    final_multiplier = base_multiplier * (1 + item_streak_bonus)
+    if cursed_bonus > 0:
+        final_multiplier *= cursed_bonus
+
+    # Bonus extra por blackjack en racha
+    if is_blackjack:
+        final_multiplier += diff["blackjack_streak_bonus"]
+
+    return final_multiplier
+
+
+def strategy_rules() -> Dict[int, Tuple]:
+    """Parámetros de pago de cada garito con los que se generan las tablas
+    de estrategia básica (strategy.py), sin objetos ni rachas"""
+    return {
+        level: garito_rules(garito, 1 + win_bonus(garito, {}), CONFIG["dealer_stand_value"])
+        for level, garito in GARITOS.items()
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENUMS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class Suit(str, Enum):
+    HEARTS = "hearts"
+    DIAMONDS = "diamonds"
+    CLUBS = "clubs"
+    SPADES = "spades"
+
+class GameStatus(str, Enum):
+    WAITING_FOR_BET = "waiting_for_bet"
+    PLAYER_TURN = "player_turn"
+    DEALER_TURN = "dealer_turn"
+    ROUND_COMPLETE = "round_complete"
+    GAME_OVER = "game_over"
+    SHOP = "shop"
+    GARITO_TRANSITION = "garito_transition"
+
+class PlayerAction(str, Enum):
+    HIT = "hit"
+    STAND = "stand"
+    DOUBLE = "double"
+
+class CheatResult(str, Enum):
+    SUCCESS = "success"
+    DETECTED = "detected"
+    SUSPICIOUS = "suspicious"
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODELOS DE DATOS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+
+
+class Card:
+    """Carta inmutable. Las 52 caras están internadas (Card.face) y el id solo
+    se asigna cuando la carta sale del mazo, derivado de su posición en el shoe"""
+    __slots__ = ("rank", "suit", "id", "_points")
+    
+    def __init__(self, rank: str, suit: Suit, card_id: Optional[str] = None):
+        object.__setattr__(self, "rank", rank)
+        object.__setattr__(self, "suit", suit)
+        object.__setattr__(self, "id", card_id)
+        if rank in ('J', 'Q', 'K'):
+            points = 10
+        elif rank == 'A':
+            points = 11
+        else:
+            points = int(rank)
+        object.__setattr__(self, "_points", points)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("Card es inmutable")
+    
+    @staticmethod
+    def face(rank: str, suit) -> "Card":
+        """Cara internada para (rank, suit); suit puede ser Suit o su valor"""
+        return _FACES[(rank, suit)]
+    
+    def at(self, card_id: str) -> "Card":
+        """La misma carta con un id concreto (p.ej. al salir del mazo)"""
+        card = object.__new__(Card)
+        object.__setattr__(card, "rank", self.rank)
+        object.__setattr__(card, "suit", self.suit)
+        object.__setattr__(card, "id", card_id)
+        object.__setattr__(card, "_points", self._points)
+        return card
+    
+    def value(self) -> int:
+        return self._points
+    
+    def to_dict(self) -> Dict:
+        return {"rank": self.rank, "suit": self.suit.value, "id": self.id}
+
+
+# Las 52 caras, en orden palo → rango (el orden del shoe antes de barajar)
+FACE_LIST: List[Card] = [Card(rank, suit) for suit in Suit for rank in RANKS]
+# Suit hereda de str, así que (rank, Suit.HEARTS) y (rank, "hearts") son la misma clave
+_FACES: Dict[tuple, Card] = {(c.rank, c.suit): c for c in FACE_LIST}
+
+
+class Deck:
+    def __init__(self, deck_count: int = 6, seed: Optional[int] = None):
+        self.cards: List[Card] = []
+        self.nonce: int = 0
+        # Cada partida baraja con su propio generador: (seed, shoe) basta para
+        # reconstruir el shoe entero y reproducir cualquier ronda
+        self.seed: Optional[int] = seed if seed is not None else random.getrandbits(64)
+        self.shoe: int = 0
+        self.deck_count = deck_count
+        self.reset(deck_count)
+
+    # changed: se repartió o se rebarajó desde el último guardado (deck_state cambió)
+    changed = False
+    
+    def reset(self, deck_count: int):
+        if self.seed is None:
+            # Mazo restaurado carta a carta: pasa a modo semilla al rebarajar
+            self.seed = random.getrandbits(64)
+        self.deck_count = deck_count
+        self.shoe += 1
+        self._build_shoe()
+        self.changed = True
+    
+    def _build_shoe(self):
+        rng = random.Random((self.seed << 32) | self.shoe)
+        # El mazo solo guarda referencias a las caras internadas: ni objetos
+        # nuevos ni ids hasta que una carta se reparte o se espía
+        self.cards = FACE_LIST * self.deck_count
+        rng.shuffle(self.cards)
+        self.nonce = rng.getrandbits(24)
+    
+    def card_id(self, card: Card, position: int) -> str:
+        return f"{card.rank}-{card.suit.value}-{(self.nonce + position) & 0xFFFFFF:06x}"
+    
+    def _card_at(self, position: int) -> Card:
+        return self.cards[position].at(self.card_id(self.cards[position], position))
+    
+    @classmethod
+    def from_cards(cls, cards: List[Card], nonce: int) -> "Deck":
+        """Construye un mazo con cartas ya conocidas (sin barajar ni semilla)"""
+        deck = cls.__new__(cls)
+        deck.cards = cards
+        deck.nonce = nonce
+        deck.seed = None
+        deck.shoe = 0
+        deck.deck_count = CONFIG["deck_count"]
+        return deck
+    
+    @classmethod
+    def from_seed(cls, seed: int, shoe: int, cursor: int, deck_count: int) -> "Deck":
+        """Reconstruye el shoe a partir de la semilla y descarta las cartas ya repartidas"""
+        deck = cls.__new__(cls)
+        deck.seed = seed
+        deck.shoe = shoe
+        deck.deck_count = deck_count
+        deck._build_shoe()
+        del deck.cards[len(deck.cards) - cursor:]
+        return deck
+    
+    @property
+    def cursor(self) -> int:
+        """Cartas ya repartidas del shoe actual"""
+        return self.deck_count * 52 - len(self.cards)
+    
+    def deal(self) -> Card:
+        if len(self.cards) < 20:
+            self.reset(CONFIG["deck_count"])
+        card = self._card_at(len(self.cards) - 1)
+        self.cards.pop()
+        self.changed = True
+        return card
+    
+    def peek(self, count: int = 3) -> List[Dict]:
+        """Ver las próximas cartas sin sacarlas (en orden de salida)"""
+        # Las cartas salen con pop() desde el final, así que invertimos el orden
+        last = len(self.cards) - 1
+        return [self._card_at(i).to_dict() for i in range(last, max(last - count, -1), -1)]
+    
+    def peek_next(self) -> Dict:
+        """Ver solo la próxima carta sin sacarla"""
+        if self.cards:
+            return self._card_at(len(self.cards) - 1).to_dict()
+        return None
+    
+    @property
+    def remaining(self) -> int:
+        return len(self.cards)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CODEC COMPACTO DEL MAZO (deck_state)
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# deck_state se guarda como un string base64 en vez de una lista JSON de dicts.
+#
+# v2 (mazo con semilla): solo lo necesario para reconstruir el shoe
+#   byte 0      → versión (2)
+#   bytes 1-8   → semilla de la partida
+#   bytes 9-12  → número de shoe (cuántas veces se ha barajado)
+#   bytes 13-14 → cursor (cartas ya repartidas de este shoe)
+#   byte 15     → número de barajas
+#
+# v1 (mazo sin semilla, p.ej. restaurado de una fila legacy):
+#   byte 0      → versión (1)
+#   bytes 1-3   → nonce del shoe (de él se derivan los ids de las cartas)
+#   bytes 4..   → una carta por byte: índice_palo * 13 + índice_rango
+#
+# Las filas antiguas (lista de {"rank","suit","id"}) se siguen pudiendo leer.
+
+DECK_CODEC_V1 = 1
+DECK_CODEC_V2 = 2
+_SEEDED_HEADER = struct.Struct(">BQIHB")
+
+# Card no define __eq__/__hash__, así que las caras internadas se indexan por identidad
+_CARD_CODES = {face: code for code, face in enumerate(FACE_LIST)}
+
+
+def encode_deck(deck: Deck) -> str:
+    """Serializa el mazo en el formato compacto versionado"""
+    if deck.seed is not None:
+        payload = _SEEDED_HEADER.pack(DECK_CODEC_V2, deck.seed, deck.shoe, deck.cursor, deck.deck_count)
+    else:
+        payload = bytearray([DECK_CODEC_V1])
+        payload += deck.nonce.to_bytes(3, "big")
+        payload += bytes(_CARD_CODES[c] for c in deck.cards)
+    return base64.b64encode(bytes(payload)).decode("ascii")
+
+
+def decode_deck(deck_state) -> Deck:
+    """Restaura un mazo desde deck_state (formato compacto o lista JSON legacy)"""
+    if isinstance(deck_state, list):
+        cards = [Card.face(c["rank"], c["suit"]) for c in deck_state]
+        return Deck.from_cards(cards, random.getrandbits(24))
+    
+    payload = base64.b64decode(deck_state)
+    version = payload[0]
+    
+    if version == DECK_CODEC_V2:
+        _, seed, shoe, cursor, deck_count = _SEEDED_HEADER.unpack(payload)
+        return Deck.from_seed(seed, shoe, cursor, deck_count)
+    
+    if version == DECK_CODEC_V1:
+        nonce = int.from_bytes(payload[1:4], "big")
+        return Deck.from_cards([FACE_LIST[code] for code in payload[4:]], nonce)
+    
+    raise ValueError(f"Versión de deck_state desconocida: {version}")
+
+
+class Hand:
+    """Mano con el total llevado al día: cada carta que entra o sale actualiza
+    la suma dura (ases a 1) y el número de ases, así valor, mano blanda y
+    blackjack son O(1). Las cartas solo deben cambiar con los métodos de Hand.
+
+    Los métodos que cambian la mano la marcan como cambiada (changed) para
+    que la partida sepa que tiene que guardar la columna; quien cambie un
+    indicador desde fuera también debe marcarla."""
+    changed = False
+
+    def __init__(self):
+        self.cards: List[Card] = []
+        self.bet: int = 0
+        self.is_standing: bool = False
+        self.is_busted: bool = False
+        self.is_blackjack: bool = False
+        self.is_doubled: bool = False
+        self.hard_total: int = 0
+        self.aces: int = 0
+    
+    @staticmethod
+    def _hard_points(card: Card) -> int:
+        return 1 if card.rank == 'A' else card.value()
+    
+    def add_card(self, card: Card):
+        self.add_card_unchecked(card)
+        self._check_status()
+    
+    def add_card_unchecked(self, card: Card):
+        """Añade la carta sin revisar bust/blackjack (free_card, restaurar de BD)"""
+        self.changed = True
+        self.cards.append(card)
+        self.hard_total += self._hard_points(card)
+        if card.rank == 'A':
+            self.aces += 1
+    
+    def remove_worst_card(self) -> Optional[Card]:
+        """Quita la carta que menos ayuda (para la trampa swap)"""
+        if not self.cards:
+            return None
+        
+        current_value = self.calculate_value()
+        worst_index = 0
+        
+        # Sin pasarse se quita siempre la primera carta; pasado, la que más
+        # baja el valor (la primera en caso de empate)
+        if current_value > 21:
+            best_improvement = None
+            for i, card in enumerate(self.cards):
+                # Valor sin esta carta, a partir de los totales de la mano
+                temp_value = self._value_for(
+                    self.hard_total - self._hard_points(card),
+                    self.aces - (card.rank == 'A'),
+                )
+                improvement = current_value - temp_value
+                if best_improvement is None or improvement > best_improvement:
+                    worst_index = i
+                    best_improvement = improvement
+        
+        self.changed = True
+        worst_card = self.cards.pop(worst_index)
+        self.hard_total -= self._hard_points(worst_card)
+        if worst_card.rank == 'A':
+            self.aces -= 1
+        self._check_status()
+        
+        return worst_card
+    
+    @staticmethod
+    def _value_for(hard_total: int, aces: int) -> int:
+        # Dos ases a 11 ya suman 22: como mucho uno cuenta como 11
+        if aces and hard_total + 10 <= 21:
+            return hard_total + 10
+        return hard_total
+    
+    def calculate_value(self) -> int:
+        return self._value_for(self.hard_total, self.aces)
+    
+    def is_soft(self) -> bool:
+        """¿Hay un as contando como 11?"""
+        return self.aces > 0 and self.hard_total + 10 <= 21
+    
+    def _check_status(self):
+        value = self.calculate_value()
+        
+        if value > 21:
+            self.is_busted = True
+            self.is_standing = True
+        
+        if len(self.cards) == 2 and value == 21:
+            self.is_blackjack = True
+            self.is_standing = True
+    
+    def can_double(self) -> bool:
+        return len(self.cards) == 2 and not self.is_doubled
+    
+    def to_dict(self, hide_second: bool = False) -> Dict:
+        if hide_second and len(self.cards) > 1:
+            return {
+                "cards": [self.cards[0].to_dict(), {"rank": "?", "suit": "?", "id": "hidden"}],
+                "value": self.cards[0].value(),
+                "is_standing": self.is_standing,
+                "is_busted": False,
+                "is_blackjack": False
+            }
+        
+        return {
+            "cards": [c.to_dict() for c in self.cards],
+            "value": self.calculate_value(),
+            "is_standing": self.is_standing,
+            "is_busted": self.is_busted,
+            "is_blackjack": self.is_blackjack,
+            "is_doubled": self.is_doubled
+        }
+
+
+class PlayerInventory:
+    """Objetos, efectos y trampas. Las asignaciones y los métodos que mutan
+    los dicts/listas marcan el inventario como cambiado (changed)."""
+    changed = False
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != "changed":
+            object.__setattr__(self, "changed", True)
+
+    def __init__(self):
+        self.items: Dict[str, int] = {}  # item_id -> cantidad
+        self.passive_effects: Dict[str, float] = {}  # efecto -> valor acumulado
+        self.unlocked_cheats: List[str] = ["peek_card", "peek_next_card"]  # Trampas desbloqueadas (peek_next_card disponible desde inicio)
+        self.cheat_cooldowns: Dict[str, int] = {}  # trampa -> rondas restantes
+        self.guaranteed_cheat: bool = False  # Del cigarro
+        self.rewind_available: bool = False
+    
+    def add_item(self, item_id: str, quantity: int = 1):
+        self.changed = True
+        self.items[item_id] = self.items.get(item_id, 0) + quantity
+        
+        # Aplicar efectos pasivos inmediatamente
+        item = ITEMS.get(item_id)
+        if item and not item.get("consumable", True):
+            effect = item["effect"]
+            value = item.get("value", 0)
+            self.passive_effects[effect] = self.passive_effects.get(effect, 0) + value
+    
+    def use_item(self, item_id: str) -> bool:
+        if self.items.get(item_id, 0) <= 0:
+            return False
+        
+        item = ITEMS.get(item_id)
+        if not item or not item.get("consumable", True):
+            return False
+        
+        self.changed = True
+        self.items[item_id] -= 1
+        if self.items[item_id] <= 0:
+            del self.items[item_id]
+        
+        return True
+    
+    def unlock_cheat(self, cheat_id: str):
+        if cheat_id not in self.unlocked_cheats:
+            self.changed = True
+            self.unlocked_cheats.append(cheat_id)
+    
+    def can_use_cheat(self, cheat_id: str) -> bool:
+        if cheat_id not in self.unlocked_cheats:
+            return False
+        return self.cheat_cooldowns.get(cheat_id, 0) <= 0
+    
+    def use_cheat(self, cheat_id: str):
+        cheat = TRAMPAS.get(cheat_id)
+        if cheat:
+            self.changed = True
+            self.cheat_cooldowns[cheat_id] = cheat.get("cooldown", 0)
+    
+    def tick_cooldowns(self):
+        for cheat_id, rounds in self.cheat_cooldowns.items():
+            if rounds > 0:
+                self.changed = True
+                self.cheat_cooldowns[cheat_id] = rounds - 1
+    
+    def to_dict(self) -> Dict:
+        # Copias: el estado devuelto se guarda en el historial de versiones
+        return {
+            "items": dict(self.items),
+            "passive_effects": dict(self.passive_effects),
+            "unlocked_cheats": list(self.unlocked_cheats),
+            "cheat_cooldowns": dict(self.cheat_cooldowns),
+            "guaranteed_cheat": self.guaranteed_cheat,
+        }
+
+
+# Columnas de games que se guardan y cómo se obtiene cada una de la partida
+# (para serializar solo las cambiadas; to_db_model() las escribe todas de corrido)
+GAME_COLUMNS = {
+    "player_name": lambda game: game.player_name,
+    "player_chips": lambda game: game.player_chips,
+    "stress": lambda game: game.stress,
+    "status": lambda game: game.status.value,
+    "difficulty": lambda game: game.difficulty,
+    "current_garito": lambda game: game.current_garito,
+    "garitos_completed": lambda game: game.garitos_completed,
+    "win_streak": lambda game: game.win_streak,
+    "max_win_streak": lambda game: game.max_win_streak,
+    "last_streak_bonus": lambda game: game.last_streak_bonus,
+    "inventory_items": lambda game: game.inventory.items,
+    "inventory_passive_effects": lambda game: game.inventory.passive_effects,
+    "inventory_unlocked_cheats": lambda game: game.inventory.unlocked_cheats,
+    "inventory_cheat_cooldowns": lambda game: game.inventory.cheat_cooldowns,
+    "inventory_guaranteed_cheat": lambda game: game.inventory.guaranteed_cheat,
+    "inventory_rewind_available": lambda game: game.inventory.rewind_available,
+    "current_bet": lambda game: game.current_bet,
+    "player_hand": lambda game: game._serialize_hand(game.player_hand) if game.player_hand else None,
+    "dealer_hand": lambda game: game._serialize_hand(game.dealer_hand) if game.dealer_hand else None,
+    "deck_state": lambda game: encode_deck(game.deck),
+    "round_result": lambda game: game.round_result,
+    "round_message": lambda game: game.round_message,
+    "dealer_card_revealed": lambda game: game.dealer_card_revealed,
+    "peeked_cards": lambda game: game.peeked_cards,
+    "next_card_peeked": lambda game: game.next_card_peeked,
+    "cheat_used_this_round": lambda game: game.cheat_used_this_round,
+    "last_round_state": lambda game: game.last_round_state,
+}
+STATS_COLUMNS = ("wins", "losses", "pushes", "rounds", "cheats_used", "cheats_detected")
+INVENTORY_COLUMNS = tuple(column for column in GAME_COLUMNS if column.startswith("inventory_"))
+
+# Atributo de Game -> columnas que cambian al asignarlo (game_stats usa los mismos nombres)
+_ATTR_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    name: (name,) for name in list(GAME_COLUMNS) + list(STATS_COLUMNS) if name not in INVENTORY_COLUMNS
+}
+_ATTR_COLUMNS["deck"] = ("deck_state",)
+_ATTR_COLUMNS["inventory"] = INVENTORY_COLUMNS
+
+
+class Game:
+    def __setattr__(self, name, value):
+        # Seguimiento de cambios en el momento de la mutación: sin fotos ni
+        # diffs al guardar. Se anota el atributo; _dirty_columns() lo traduce
+        self.__dict__[name] = value
+        self._dirty.add(name)
+
+    def __init__(self, game_id: str, player_name: str, difficulty: str = "normal"):
+        # Atributos asignados desde el último mark_clean(); las manos, el mazo y
+        # el inventario llevan además su propio indicador changed
+        self.__dict__["_dirty"] = set()
+        self.id = game_id
+        self.player_name = player_name
+        self.difficulty = difficulty
+
+        # Obtener configuración de dificultad
+        diff_settings = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS["normal"])
+
+        self.player_chips = diff_settings["starting_chips"]
+        self.status = GameStatus.WAITING_FOR_BET
+        self.stress = diff_settings["starting_stress"]
+
+        # Sistema de garitos
+        self.current_garito = 1
+        self.garitos_completed: List[int] = []
+
+        # Inventario
+        self.inventory = PlayerInventory()
+
+        # Estadísticas
+        self.wins = 0
+        self.losses = 0
+        self.pushes = 0
+        self.rounds = 0
+        self.cheats_used = 0
+        self.cheats_detected = 0
+
+        # Sistema de Win Streak
+        self.win_streak = 0           # Racha actual de victorias
+        self.max_win_streak = 0       # Racha máxima alcanzada
+        self.last_streak_bonus = 0    # Último bonus obtenido por racha
+
+        # Estado de la ronda
+        self.deck = Deck(CONFIG["deck_count"])
+        self.player_hand: Optional[Hand] = None
+        self.dealer_hand: Optional[Hand] = None
+        self.current_bet = 0
+        self.round_result: Optional[str] = None
+        self.round_message: Optional[str] = None
+
+        # Estado de trampas esta ronda
+        self.dealer_card_revealed = False
+        self.peeked_cards: List[Dict] = []
+        self.next_card_peeked: Optional[Dict] = None  # Nueva: próxima carta espiada
+        self.cheat_used_this_round: Optional[str] = None
+
+        # Para rewind
+        self.last_round_state: Optional[Dict] = None
+
+        # Estado guardado en la BD, para escribir solo las columnas que cambian.
+        # db_row_exists: True (fila existe y coincide con el último mark_clean),
+        # False (partida nueva) o None (desconocido, p.ej. traída del session store)
+        self.db_row_exists: Optional[bool] = False
+
+        # Versión del estado guardado: cada guardado la incrementa y solo
+        # se acepta si nadie guardó antes (control optimista de concurrencia)
+        self.version = 0
+
+    def get_difficulty_settings(self) -> Dict:
+        """Obtiene la configuración de dificultad actual"""
+        return DIFFICULTY_SETTINGS.get(self.difficulty, DIFFICULTY_SETTINGS["normal"])
+
+    def calculate_streak_bonus(self, base_winnings: int, is_blackjack: bool = False) -> tuple:
+        """Calcula el bonus por racha de victorias
+        Retorna: (winnings_con_bonus, streak_bonus_amount, streak_multiplier)
+        """
+        if self.win_streak < 2:
+            return base_winnings, 0, 1.0
+
+        final_multiplier = streak_multiplier(
+            self.get_difficulty_settings(), self.win_streak, self.inventory.passive_effects, is_blackjack
+        )
+
+        streak_bonus = int(base_winnings * (final_multiplier - 1))
+        total_winnings = base_winnings + streak_bonus
+
+        return total_winnings, streak_bonus, final_multiplier
+    
+    def get_garito(self) -> Dict:
+        return GARITOS.get(self.current_garito, GARITOS[1])
+    
+    def check_garito_advancement(self) -> bool:
+        """Verifica si el jugador puede avanzar al siguiente garito"""
+        garito = self.get_garito()
+        chips_needed = garito.get("chips_to_advance")
+        
+        if chips_needed and self.player_chips >= chips_needed:
+            return True
+        return False
+    
+    def can_afford_minimum_bet(self) -> bool:
+        """Verifica si el jugador puede pagar la apuesta mínima"""
+        garito = self.get_garito()
+        min_bet = garito.get("min_bet", CONFIG["minimum_bet"])
+        return self.player_chips >= min_bet
+    
+    def advance_garito(self) -> Dict:
+        """Avanza al siguiente garito"""
+        if self.current_garito >= 5:
+            return {"success": False, "message": "Ya estás en el garito final"}
+        
+        old_garito = self.get_garito()
+        self.garitos_completed = self.garitos_completed + [self.current_garito]
+        self.current_garito += 1
+        new_garito = self.get_garito()
+        
+        # Desbloquear trampa del garito anterior
+        for cheat_id in old_garito.get("unlocks", []):
+            self.inventory.unlock_cheat(cheat_id)
+        
+        # Reset rewind para nuevo garito
+        if self.inventory.items.get("reloj_bolsillo", 0) > 0:
+            self.inventory.rewind_available = True
+        
+        self.status = GameStatus.SHOP
+        
+        return {
+            "success": True,
+            "old_garito": old_garito["name"],
+            "new_garito": new_garito["name"],
+            "unlocked_cheats": old_garito.get("unlocks", []),
+            "message": f"¡Bienvenido a {new_garito['name']}!"
+        }
+    
+    def calculate_detection_chance(self, cheat_id: str) -> float:
+        """Calcula la probabilidad de ser detectado al hacer trampa"""
+        # Reducción por objetos pasivos
+        reduction = self.inventory.passive_effects.get("reduce_detection", 0)
+        return detection_chance(self.current_garito, self.difficulty, cheat_id, self.stress, reduction)
+    
+    def attempt_cheat(self, cheat_id: str) -> Dict:
+        """Intenta hacer una trampa"""
+        if self.status != GameStatus.PLAYER_TURN:
+            return {"success": False, "message": "No es momento de hacer trampas"}
+        
+        if not self.inventory.can_use_cheat(cheat_id):
+            return {"success": False, "message": "Trampa no disponible o en cooldown"}
+        
+        cheat = TRAMPAS.get(cheat_id)
+        if not cheat:
+            return {"success": False, "message": "Trampa desconocida"}
+        
+        # Verificar costo de fichas
+        chip_cost = cheat.get("chip_cost", 0)
+        if chip_cost > 0 and self.player_chips < chip_cost:
+            return {"success": False, "message": "Fichas insuficientes para esta trampa"}
+        
+        # Verificar cigarro de la suerte
+        guaranteed = self.inventory.guaranteed_cheat
+        if guaranteed:
+            self.inventory.guaranteed_cheat = False
+        
+        # Calcular detección
+        detection_chance = self.calculate_detection_chance(cheat_id)
+        roll = random.random()
+        
+        self.cheats_used += 1
+        self.inventory.use_cheat(cheat_id)
+        
+        # Pagar costo de fichas
+        if chip_cost > 0:
+            self.player_chips -= chip_cost
+        
+        # Aumentar estrés
+        stress_cost = cheat.get("stress_cost", 10)
+        self.stress = min(CONFIG["max_stress"], self.stress + stress_cost)
+        
+        result = {
+            "cheat_id": cheat_id,
+            "cheat_name": cheat["name"],
+            "detection_chance": f"{detection_chance*100:.0f}%",
+            "stress_added": stress_cost,
+            "current_stress": self.stress,
+        }
+        
+        if not guaranteed and roll < detection_chance:
+            # ¡Detectado!
+            diff = self.get_difficulty_settings()
+            self.cheats_detected += 1
+            penalty = self.current_bet  # Pierdes la apuesta actual
+            stress_penalty = diff.get("stress_gain_detected", 15)
+            self.stress = min(CONFIG["max_stress"], self.stress + stress_penalty)
+
+            # Perder racha al ser detectado
+            self.win_streak = 0
+
+            result["result"] = CheatResult.DETECTED.value
+            result["message"] = f"¡{self.get_garito()['dealer_name']} te pillo! Pierdes ${penalty}"
+            result["penalty"] = penalty
+
+            # Terminar la ronda como pérdida
+            self._end_round("loss", f"¡DETECTADO HACIENDO TRAMPA! -${self.current_bet}")
+
+            return result
+        
+        # ¡Éxito! Aplicar efecto
+        result["result"] = CheatResult.SUCCESS.value
+        self.cheat_used_this_round = cheat_id
+        
+        effect = cheat["effect"]
+        
+        if effect == "reveal_dealer":
+            self.dealer_card_revealed = True
+            result["revealed_card"] = self.dealer_hand.cards[1].to_dict()
+            result["message"] = f"Ves que el crupier tiene: {self.dealer_hand.cards[1].rank}{self.dealer_hand.cards[1].suit.value}"
+        
+        elif effect == "peek_next":
+            # Nueva trampa: ver la próxima carta del mazo
+            self.next_card_peeked = self.deck.peek_next()
+            result["next_card"] = self.next_card_peeked
+            result["message"] = f"¡La próxima carta será: {self.next_card_peeked['rank']} de {self.next_card_peeked['suit']}!"
+        
+        elif effect == "swap_worst":
+            removed = self.player_hand.remove_worst_card()
+            new_card = self.deck.deal()
+            self.player_hand.add_card(new_card)
+            result["removed_card"] = removed.to_dict() if removed else None
+            result["new_card"] = new_card.to_dict()
+            result["message"] = f"Cambiaste {removed.rank} por {new_card.rank}"
+        
+        elif effect == "free_card":
+            new_card = self.deck.deal()
+            self.player_hand.add_card_unchecked(new_card)  # Sin el check de add_card para evitar el bust
+            # Recalcular manualmente
+            if self.player_hand.calculate_value() > 21:
+                self.player_hand.is_busted = True
+            result["new_card"] = new_card.to_dict()
+            result["message"] = f"Robaste un {new_card.rank} sin que nadie lo note"
+        
+        elif effect == "see_deck":
+            self.peeked_cards = self.deck.peek(3)
+            result["peeked_cards"] = self.peeked_cards
+            result["message"] = "Puedes ver las próximas 3 cartas del mazo"
+        
+        elif effect == "dealer_mistake":
+            # El dealer se "equivoca" - le añadimos una carta mala
+            suit = random.choice(list(Suit))
+            bad_card = Card.face("10", suit).at(f"10-{suit.value}-{os.urandom(3).hex()}")
+            self.dealer_hand.add_card(bad_card)
+            result["message"] = "El crupier 'accidentalmente' roba una carta de más"
+        
+        return result
+    
+    def use_item(self, item_id: str) -> Dict:
+        """Usa un objeto consumible"""
+        item = ITEMS.get(item_id)
+        if not item:
+            return {"success": False, "message": "Objeto desconocido"}
+        
+        if not self.inventory.use_item(item_id):
+            return {"success": False, "message": "No tienes ese objeto"}
+        
+        effect = item["effect"]
+        result = {
+            "success": True,
+            "item_name": item["name"],
+            "effect": effect,
+        }
+        
+        if effect == "reduce_stress":
+            reduction = item.get("value", 10)
+            self.stress = max(0, self.stress - reduction)
+            result["message"] = f"Te relajas... Estrés -{reduction}"
+            result["new_stress"] = self.stress
+        
+        elif effect == "guaranteed_cheat":
+            self.inventory.guaranteed_cheat = True
+            result["message"] = "Tu próxima trampa no fallará..."
+        
+        elif effect == "lucky_draw":
+            # Implementado en deal
+            result["message"] = "Sientes que la suerte está de tu lado..."
+        
+        elif effect == "rewind":
+            if self.last_round_state and self.inventory.rewind_available:
+                self._restore_round_state(self.last_round_state)
+                self.inventory.rewind_available = False
+                result["message"] = "El tiempo retrocede..."
+            else:
+                result["success"] = False
+                result["message"] = "No hay ronda que repetir"
+        
+        return result
+    
+    def buy_item(self, item_id: str) -> Dict:
+        """Compra un objeto en la tienda"""
+        if self.status != GameStatus.SHOP:
+            return {"success": False, "message": "La tienda está cerrada"}
+        
+        item = ITEMS.get(item_id)
+        if not item:
+            return {"success": False, "message": "Objeto desconocido"}
+        
+        price = item["price"]
+        if self.player_chips < price:
+            return {"success": False, "message": "Fichas insuficientes"}
+        
+        self.player_chips -= price
+        self.inventory.add_item(item_id)
+        
+        return {
+            "success": True,
+            "item_name": item["name"],
+            "price": price,
+            "remaining_chips": self.player_chips,
+            "message": f"Compraste {item['name']} por ${price}"
+        }
+    
+    def leave_shop(self):
+        """Salir de la tienda y volver a jugar"""
+        self.status = GameStatus.WAITING_FOR_BET
+    
+    def place_bet(self, amount: int):
+        if self.status != GameStatus.WAITING_FOR_BET:
+            raise ValueError("No es momento de apostar")
+        
+        garito = self.get_garito()
+        min_bet = garito.get("min_bet", CONFIG["minimum_bet"])
+        max_bet = garito.get("max_bet", CONFIG["maximum_bet"])
+        
+        if amount < min_bet:
+            raise ValueError(f"Apuesta mínima en este garito: ${min_bet}")
+        
+        if amount > self.player_chips:
+            raise ValueError("Fichas insuficientes")
+        
+        if amount > max_bet:
+            raise ValueError(f"Apuesta máxima en este garito: ${max_bet}")
+        
+        # Guardar estado para rewind
+        self._save_round_state()
+        
+        self.current_bet = amount
+        self.player_chips -= amount
+        self.dealer_card_revealed = False
+        self.peeked_cards = []
+        self.next_card_peeked = None  # Reset de próxima carta espiada
+        self.cheat_used_this_round = None
+        
+        self._deal_initial_cards()
+    
+    def _save_round_state(self):
+        """Guarda el estado actual para posible rewind"""
+        self.last_round_state = {
+            "chips": self.player_chips,
+            "stress": self.stress,
+            "wins": self.wins,
+            "losses": self.losses,
+            "pushes": self.pushes,
+            "rounds": self.rounds,
+        }
+    
+    def _restore_round_state(self, state: Dict):
+        """Restaura un estado guardado"""
+        self.player_chips = state["chips"]
+        self.stress = state["stress"]
+        self.wins = state["wins"]
+        self.losses = state["losses"]
+        self.pushes = state["pushes"]
+        self.rounds = state["rounds"]
+        self.status = GameStatus.WAITING_FOR_BET
+        self.player_hand = None
+        self.dealer_hand = None
+        self.round_result = None
+        self.round_message = None
+    
+    def _deal_initial_cards(self):
+        self.player_hand = Hand()
+        self.dealer_hand = Hand()
+        self.player_hand.bet = self.current_bet
+        self.round_result = None
+        self.round_message = None
+        
+        self.player_hand.add_card(self.deck.deal())
+        self.dealer_hand.add_card(self.deck.deal())
+        self.player_hand.add_card(self.deck.deal())
+        self.dealer_hand.add_card(self.deck.deal())
+        
+        if self.player_hand.is_blackjack:
+            if self.dealer_hand.is_blackjack:
+                if has_rule(self.get_garito(), "widow_curse"):
+                    self._end_round("loss", "¡LA MALDICION DE LA VIUDA! Empate = Derrota")
+                else:
+                    self._end_round("push", "¡DOBLE BLACKJACK! EMPATE")
+            else:
+                # Incrementar racha ANTES de calcular bonus
+                self.win_streak += 1
+                self.max_win_streak = max(self.max_win_streak, self.win_streak)
+
+                base_payout = blackjack_base_payout(self.current_bet, self.inventory.passive_effects)
+
+                # Calcular bonus de racha (con flag de blackjack)
+                final_payout, streak_bonus, streak_mult = self.calculate_streak_bonus(base_payout, is_blackjack=True)
+                self.last_streak_bonus = streak_bonus
+
+                self.player_chips += self.current_bet + final_payout
+
+                if streak_bonus > 0:
+                    self._end_round("blackjack", f"¡¡¡BLACKJACK!!! +${base_payout} +${streak_bonus} RACHA x{streak_mult:.1f}!")
+                else:
+                    self._end_round("blackjack", f"¡¡¡BLACKJACK!!! +${final_payout}")
+        else:
+            self.status = GameStatus.PLAYER_TURN
+    
+    def player_action(self, action: PlayerAction):
+        if self.status != GameStatus.PLAYER_TURN:
+            raise ValueError("No es tu turno")
+        
+        if action == PlayerAction.HIT:
+            self._hit()
+        elif action == PlayerAction.STAND:
+            self._stand()
+        elif action == PlayerAction.DOUBLE:
+            self._double()
+    
+    def _hit(self):
+        self.player_hand.add_card(self.deck.deal())
+        self.next_card_peeked = None  # Limpiar carta espiada después de usarla
+        
+        if self.player_hand.is_busted:
+            self._end_round("loss", f"¡TE PASASTE! -${self.current_bet}")
+        elif self.player_hand.calculate_value() == 21:
+            self._stand()
+    
+    def _stand(self):
+        self.player_hand.is_standing = True
+        self.player_hand.changed = True
+        self.status = GameStatus.DEALER_TURN
+        self._dealer_play()
+    
+    def _double(self):
+        if not self.player_hand.can_double():
+            raise ValueError("No puedes doblar")
+        
+        if self.player_chips < self.current_bet:
+            raise ValueError("Fichas insuficientes para doblar")
+        
+        self.player_chips -= self.current_bet
+        self.current_bet *= 2
+        self.player_hand.is_doubled = True
+        self.player_hand.add_card(self.deck.deal())
+        self.next_card_peeked = None  # Limpiar carta espiada
+        
+        if self.player_hand.is_busted:
+            self._end_round("loss", f"¡TE PASASTE AL DOBLAR! -${self.current_bet}")
+        else:
+            self._stand()
+    
+    def _dealer_play(self):
+        while self.dealer_hand.calculate_value() < CONFIG["dealer_stand_value"]:
+            self.dealer_hand.add_card(self.deck.deal())
+        
+        self._resolve_round()
+    
+    def _resolve_round(self):
+        player_value = self.player_hand.calculate_value()
+        dealer_value = self.dealer_hand.calculate_value()
+        garito = self.get_garito()
+
+        # Calcular bonus de ganancias (objetos + regla especial drunk_bonus)
+        bonus = win_bonus(garito, self.inventory.passive_effects)
+
+        # Regla especial: devils_game - BJ del dealer = pierdes todo
+        if has_rule(garito, "devils_game") and self.dealer_hand.is_blackjack:
+            total_loss = self.player_chips + self.current_bet
+            self.player_chips = 0
+            self.win_streak = 0
+            self._end_round("loss", f"¡EL DIABLO TIENE BLACKJACK! Pierdes todo: ${total_loss}")
+            return
+
+        if self.dealer_hand.is_busted:
+            # Victoria - incrementar racha
+            self.win_streak += 1
+            self.max_win_streak = max(self.max_win_streak, self.win_streak)
+
+            base_winnings = int(self.current_bet * (1 + bonus))
+            final_winnings, streak_bonus, streak_mult = self.calculate_streak_bonus(base_winnings)
+            self.last_streak_bonus = streak_bonus
+
+            self.player_chips += self.current_bet + final_winnings
+            if streak_bonus > 0:
+                self._end_round("win", f"¡CRUPIER SE PASA! +${base_winnings} +${streak_bonus} RACHA x{streak_mult:.1f}!")
+            else:
+                self._end_round("win", f"¡CRUPIER SE PASA! +${final_winnings}")
+
+        elif player_value > dealer_value:
+            # Victoria - incrementar racha
+            self.win_streak += 1
+            self.max_win_streak = max(self.max_win_streak, self.win_streak)
+
+            base_winnings = int(self.current_bet * (1 + bonus))
+            final_winnings, streak_bonus, streak_mult = self.calculate_streak_bonus(base_winnings)
+            self.last_streak_bonus = streak_bonus
+
+            self.player_chips += self.current_bet + final_winnings
+            if streak_bonus > 0:
+                self._end_round("win", f"¡GANAS! {player_value} vs {dealer_value} → +${base_winnings} +${streak_bonus} RACHA x{streak_mult:.1f}!")
+            else:
+                self._end_round("win", f"¡GANAS! {player_value} vs {dealer_value} → +${final_winnings}")
+
+        elif player_value < dealer_value:
+            self._end_round("loss", f"PIERDES {player_value} vs {dealer_value} → -${self.current_bet}")
+
+        else:
+            # Empate
+            if has_rule(garito, "widow_curse"):
+                self._end_round("loss", f"¡MALDICION! Empate = Derrota → -${self.current_bet}")
+            else:
+                # Amuleto del diablo: racha no se pierde en empates
+                has_streak_on_push = self.inventory.passive_effects.get("streak_on_push", False)
+                if not has_streak_on_push:
+                    self.win_streak = 0
+                self.player_chips += self.current_bet
+                self._end_round("push", f"EMPATE {player_value}")
+    
+    def _end_round(self, result: str, message: str):
+        self.round_result = result
+        self.round_message = message
+        self.rounds += 1
+
+        diff = self.get_difficulty_settings()
+
+        if result == "win" or result == "blackjack":
+            self.wins += 1
+            # Reducir estrés al ganar según dificultad
+            stress_reduction = diff.get("stress_reduction_win", 5)
+            self.stress = max(0, self.stress - stress_reduction)
+
+            # Moneda maldita: +5 estrés por victoria si está activa
+            if self.inventory.passive_effects.get("cursed_streak", 0) > 0:
+                self.stress = min(CONFIG["max_stress"], self.stress + 5)
+
+        elif result == "loss":
+            self.losses += 1
+            # Perder racha
+            self.win_streak = 0
+            # Aumentar estrés al perder según dificultad
+            stress_gain = diff.get("stress_gain_loss", 3)
+            self.stress = min(CONFIG["max_stress"], self.stress + stress_gain)
+        else:
+            self.pushes += 1
+
+        # Tick cooldowns de trampas
+        self.inventory.tick_cooldowns()
+
+        # Verificar game over - AHORA INCLUYE CHECK DE APUESTA MÍNIMA
+        garito = self.get_garito()
+        min_bet = garito.get("min_bet", CONFIG["minimum_bet"])
+
+        if self.player_chips <= 0:
+            self.status = GameStatus.GAME_OVER
+            self.round_message = message  # Mantener mensaje original
+        elif self.player_chips < min_bet:
+            # NUEVO: Game Over si no puedes pagar la apuesta mínima
+            self.status = GameStatus.GAME_OVER
+            self.round_message = f"Sin fichas suficientes para la apuesta minima (${min_bet}). Te echan del garito..."
+        elif self.stress >= CONFIG["max_stress"]:
+            self.status = GameStatus.GAME_OVER
+            self.round_message = "¡COLAPSO NERVIOSO! El estres te consume..."
+        else:
+            self.status = GameStatus.ROUND_COMPLETE
+    
+    def new_round(self):
+        if self.status == GameStatus.GAME_OVER:
+            raise ValueError("Game Over")
+        
+        # Verificar si puede avanzar de garito
+        can_advance = self.check_garito_advancement()
+        
+        self.status = GameStatus.WAITING_FOR_BET
+        self.player_hand = None
+        self.dealer_hand = None
+        self.current_bet = 0
+        self.round_result = None
+        self.round_message = None
+        self.dealer_card_revealed = False
+        self.peeked_cards = []
+        self.next_card_peeked = None
+
+        return {"can_advance_garito": can_advance}
+
+    def odds(self) -> Dict:
+        """Probabilidades exactas de la mano en juego, con lo que el jugador
+        puede saber: cartas vistas, carta oculta si se reveló y cartas espiadas"""
+        if self.status != GameStatus.PLAYER_TURN:
+            raise ValueError("No hay ninguna mano en juego")
+
+        hole_hidden = not self.dealer_card_revealed
+        dealer_cards = self.dealer_hand.cards
+        visible = [c.value() for i, c in enumerate(dealer_cards) if i != 1 or not hole_hidden]
+        hidden = [dealer_cards[1].value()] if hole_hidden else []
+        deck = self.deck
+        upcoming: List[int] = []
+
+        if len(deck.cards) < 20:
+            # La próxima carta ya sale de un shoe nuevo: lo espiado no sirve y
+            # la carta oculta viene del shoe viejo
+            pool = rank_counts(c.value() for c in FACE_LIST * CONFIG["deck_count"])
+            hole_pool = rank_counts([c.value() for c in deck.cards] + hidden)
+        else:
+            # Cartas espiadas que siguen en lo alto del mazo, en orden de salida
+            known_ids = {c["id"] for c in self.peeked_cards}
+            if self.next_card_peeked:
+                known_ids.add(self.next_card_peeked["id"])
+            for position in range(len(deck.cards) - 1, len(deck.cards) - 1 - len(known_ids), -1):
+                if deck.card_id(deck.cards[position], position) not in known_ids:
+                    break
+                upcoming.append(deck.cards[position].value())
+            unseen = deck.cards[:len(deck.cards) - len(upcoming)]
+            pool = rank_counts([c.value() for c in unseen] + hidden)
+            hole_pool = None
+
+        dealer_final = dealer_distribution(
+            pool, visible, hole_hidden, upcoming, hole_pool, CONFIG["dealer_stand_value"]
+        )
+        if len(dealer_cards) != 2:
+            dealer_blackjack = 0.0
+        elif hole_hidden:
+            dealer_blackjack = dealer_blackjack_chance(pool if hole_pool is None else hole_pool, visible[0])
+        else:
+            dealer_blackjack = 1.0 if self.dealer_hand.is_blackjack else 0.0
+
+        return {
+            "player_value": self.player_hand.calculate_value(),
+            "bust_on_hit": bust_chance(pool, [c.value() for c in self.player_hand.cards], upcoming),
+            "dealer_visible": visible,
+            "dealer_final": dealer_final,
+            "dealer_blackjack": dealer_blackjack,
+            "known_upcoming": len(upcoming),
+            "unseen_cards": sum(pool),
+        }
+
+    def hint(self) -> Dict:
+        """Jugada de la estrategia básica del garito para la mano en juego"""
+        if self.status != GameStatus.PLAYER_TURN:
+            raise ValueError("No hay ninguna mano en juego")
+        if not strategy_tables.ready:
+            raise ValueError("Tabla de estrategia no disponible")
+
+        value = self.player_hand.calculate_value()
+        soft = self.player_hand.is_soft()
+        upcard = self.dealer_hand.cards[0].value()
+        can_double = self.player_hand.can_double() and self.player_chips >= self.current_bet
+        return {
+            "action": strategy_tables.action(self.current_garito, value, soft, upcard, can_double),
+            "player_value": value,
+            "soft": soft,
+            "dealer_upcard": upcard,
+            "can_double": can_double,
+        }
+
+    def to_dict(self) -> Dict:
+        diff = self.get_difficulty_settings()
+        hide_dealer = self.status == GameStatus.PLAYER_TURN and not self.dealer_card_revealed
+
+        # Bloques estáticos precalculados (con fallback si el id no existe)
+        garito_view = GARITO_VIEWS.get(self.current_garito)
+        if garito_view is None:
+            garito_view = {**GARITO_VIEWS[1], "level": self.current_garito}
+        difficulty_view = DIFFICULTY_VIEWS.get(self.difficulty)
+        if difficulty_view is None:
+            difficulty_view = {**DIFFICULTY_VIEWS["normal"], "id": self.difficulty}
+
+        # Lista de trampas disponibles con estado
+        in_turn = self.status == GameStatus.PLAYER_TURN
+        reduction = self.inventory.passive_effects.get("reduce_detection", 0)
+        cooldowns = self.inventory.cheat_cooldowns
+        available_cheats = [
+            {
+                **cheat_view(cheat_id),
+                "can_use": cooldowns.get(cheat_id, 0) <= 0,
+                "cooldown": cooldowns.get(cheat_id, 0),
+                "detection_chance": detection_label(self.current_garito, self.difficulty, cheat_id, self.stress, reduction) if in_turn else "?",
+            }
+            for cheat_id in self.inventory.unlocked_cheats
+        ]
+
+        # Calcular próximo multiplicador de racha
+        next_streak = self.win_streak + 1
+        streak_mults = diff["win_streak_multipliers"]
+        next_streak_key = min(next_streak, 5)
+        next_multiplier = streak_mults.get(next_streak_key, 1.0) if next_streak >= 2 else 1.0
+
+        # Aplicar modificadores de items al multiplicador mostrado
+        item_streak_bonus = self.inventory.passive_effects.get("streak_multiplier", 0)
+        cursed_bonus = self.inventory.passive_effects.get("cursed_streak", 0)
+        if item_streak_bonus > 0:
+            next_multiplier = next_multiplier * (1 + item_streak_bonus)
+        if cursed_bonus > 0:
+            next_multiplier *= cursed_bonus
+
+        return {
+            "id": self.id,
+            "version": self.version,
+            "player_name": self.player_name,
+            "player_chips": self.player_chips,
+            "stress": self.stress,
+            "max_stress": CONFIG["max_stress"],
+            "status": self.status.value,
+            "current_bet": self.current_bet,
+            "player_hand": self.player_hand.to_dict() if self.player_hand else None,
+            "dealer_hand": self.dealer_hand.to_dict(hide_second=hide_dealer) if self.dealer_hand else None,
+            "round_result": self.round_result,
+            "round_message": self.round_message,
+
+            # Dificultad
+            "difficulty": difficulty_view,
+
+            # Win Streak
+            "win_streak": {
+                "current": self.win_streak,
+                "max": self.max_win_streak,
+                "last_bonus": self.last_streak_bonus,
+                "next_multiplier": next_multiplier if next_streak >= 2 else None,
+                "multipliers": diff["win_streak_multipliers"],
+                "blackjack_bonus": diff["blackjack_streak_bonus"],
+            },
+
+            # Garito actual
+            "garito": garito_view,
+            "can_advance_garito": self.check_garito_advancement(),
+
+            # Inventario y trampas
+            "inventory": self.inventory.to_dict(),
+            "available_cheats": available_cheats,
+            "peeked_cards": self.peeked_cards if self.peeked_cards else None,
+            "next_card_peeked": self.next_card_peeked,
+
+            # Stats
+            "stats": self.stats_dict(),
+
+            "deck_remaining": self.deck.remaining,
+            "can_double": self.player_hand.can_double() if self.player_hand and self.status == GameStatus.PLAYER_TURN else False,
+            "can_afford_double": self.player_chips >= self.current_bet
+        }
+
+    def stats_dict(self) -> Dict:
+        return {
+            "wins": self.wins,
+            "losses": self.losses,
+            "pushes": self.pushes,
+            "rounds": self.rounds,
+            "cheats_used": self.cheats_used,
+            "cheats_detected": self.cheats_detected,
+        }
+
+    def _dirty_columns(self) -> Set[str]:
+        dirty = {column for name in self._dirty for column in _ATTR_COLUMNS.get(name, ())}
+        if self.deck.changed:
+            dirty.add("deck_state")
+        if self.player_hand is not None and self.player_hand.changed:
+            dirty.add("player_hand")
+        if self.dealer_hand is not None and self.dealer_hand.changed:
+            dirty.add("dealer_hand")
+        if self.inventory.changed:
+            dirty.update(INVENTORY_COLUMNS)
+        return dirty
+
+    def mark_clean(self, row_exists: Optional[bool] = True):
+        """Registra el estado actual como el guardado en la BD"""
+        self.db_row_exists = row_exists
+        self._dirty.clear()
+        self.deck.changed = False
+        self.inventory.changed = False
+        for hand in (self.player_hand, self.dealer_hand):
+            if hand is not None:
+                hand.changed = False
+
+    def dirty_fields(self) -> Dict:
+        """Columnas de games que cambiaron desde el último mark_clean(); solo
+        se serializan esas"""
+        dirty = self._dirty_columns()
+        return {column: value(self) for column, value in GAME_COLUMNS.items() if column in dirty}
+
+    def dirty_stats(self) -> Dict:
+        """Columnas de game_stats que cambiaron desde el último mark_clean()"""
+        return {column: getattr(self, column) for column in STATS_COLUMNS if column in self._dirty}
+
+    def to_db_model(self) -> Dict:
+        """Serialize game state for database storage"""
+        return {
+            "id": self.id,
+            "version": self.version,
+            "player_name": self.player_name,
+            "player_chips": self.player_chips,
+            "stress": self.stress,
+            "status": self.status.value,
+            "difficulty": self.difficulty,
+            "current_garito": self.current_garito,
+            "garitos_completed": self.garitos_completed,
+            "win_streak": self.win_streak,
+            "max_win_streak": self.max_win_streak,
+            "last_streak_bonus": self.last_streak_bonus,
+            "inventory_items": self.inventory.items,
+            "inventory_passive_effects": self.inventory.passive_effects,
+            "inventory_unlocked_cheats": self.inventory.unlocked_cheats,
+            "inventory_cheat_cooldowns": self.inventory.cheat_cooldowns,
+            "inventory_guaranteed_cheat": self.inventory.guaranteed_cheat,
+            "inventory_rewind_available": self.inventory.rewind_available,
+            "current_bet": self.current_bet,
+            "player_hand": self._serialize_hand(self.player_hand) if self.player_hand else None,
+            "dealer_hand": self._serialize_hand(self.dealer_hand) if self.dealer_hand else None,
+            "deck_state": encode_deck(self.deck),
+            "round_result": self.round_result,
+            "round_message": self.round_message,
+            "dealer_card_revealed": self.dealer_card_revealed,
+            "peeked_cards": self.peeked_cards,
+            "next_card_peeked": self.next_card_peeked,
+            "cheat_used_this_round": self.cheat_used_this_round,
+            "last_round_state": self.last_round_state,
+        }
+
+    def _serialize_hand(self, hand: Hand) -> Dict:
+        """Serialize a Hand object"""
+        return {
+            "cards": [c.to_dict() for c in hand.cards],
+            "bet": hand.bet,
+            "is_standing": hand.is_standing,
+            "is_busted": hand.is_busted,
+            "is_blackjack": hand.is_blackjack,
+            "is_doubled": hand.is_doubled,
+        }
+
+    @classmethod
+    def from_db_model(cls, db_game: "GameModel", stats: "StatsModel") -> "Game":
+        """Restore game state from database"""
+        game = cls.__new__(cls)
+        # Todo cuenta como cambiado hasta que el llamador haga mark_clean()
+        game.__dict__["_dirty"] = set()
+        game.id = db_game.id
+        game.player_name = db_game.player_name
+        game.player_chips = db_game.player_chips
+        game.status = GameStatus(db_game.status)
+        game.stress = db_game.stress
+        game.difficulty = getattr(db_game, 'difficulty', 'normal') or 'normal'
+        game.current_garito = db_game.current_garito
+        game.garitos_completed = db_game.garitos_completed or []
+
+        # Restore win streak
+        game.win_streak = getattr(db_game, 'win_streak', 0) or 0
+        game.max_win_streak = getattr(db_game, 'max_win_streak', 0) or 0
+        game.last_streak_bonus = getattr(db_game, 'last_streak_bonus', 0) or 0
+
+        # Restore inventory
+        game.inventory = PlayerInventory()
+        game.inventory.items = db_game.inventory_items or {}
+        game.inventory.passive_effects = db_game.inventory_passive_effects or {}
+        game.inventory.unlocked_cheats = db_game.inventory_unlocked_cheats or ["peek_card", "peek_next_card"]
+        game.inventory.cheat_cooldowns = db_game.inventory_cheat_cooldowns or {}
+        game.inventory.guaranteed_cheat = db_game.inventory_guaranteed_cheat or False
+        game.inventory.rewind_available = db_game.inventory_rewind_available or False
+
+        # Restore stats
+        game.wins = stats.wins if stats else 0
+        game.losses = stats.losses if stats else 0
+        game.pushes = stats.pushes if stats else 0
+        game.rounds = stats.rounds if stats else 0
+        game.cheats_used = stats.cheats_used if stats else 0
+        game.cheats_detected = stats.cheats_detected if stats else 0
+
+        # Restore round state
+        game.current_bet = db_game.current_bet or 0
+        game.round_result = db_game.round_result
+        game.round_message = db_game.round_message
+        game.dealer_card_revealed = db_game.dealer_card_revealed or False
+        game.peeked_cards = db_game.peeked_cards or []
+        game.next_card_peeked = db_game.next_card_peeked
+        game.cheat_used_this_round = db_game.cheat_used_this_round
+        game.last_round_state = db_game.last_round_state
+        game.version = getattr(db_game, 'version', 0) or 0
+
+        # Restore deck
+        if db_game.deck_state:
+            game.deck = decode_deck(db_game.deck_state)
+        else:
+            game.deck = Deck(CONFIG["deck_count"])
+
+        # Restore hands
+        game.player_hand = game._deserialize_hand(db_game.player_hand) if db_game.player_hand else None
+        game.dealer_hand = game._deserialize_hand(db_game.dealer_hand) if db_game.dealer_hand else None
+
+        # El llamador decide si la fila de la BD coincide (mark_clean)
+        game.db_row_exists = None
+
+        return game
+
+    def _deserialize_hand(self, hand_data: Dict) -> Hand:
+        """Restore a Hand object from dict"""
+        hand = Hand()
+        for card_data in hand_data.get("cards", []):
+            hand.add_card_unchecked(self._deserialize_card(card_data))
+        hand.bet = hand_data.get("bet", 0)
+        hand.is_standing = hand_data.get("is_standing", False)
+        hand.is_busted = hand_data.get("is_busted", False)
+        hand.is_blackjack = hand_data.get("is_blackjack", False)
+        hand.is_doubled = hand_data.get("is_doubled", False)
+        return hand
+
+    @staticmethod
+    def _deserialize_card(card_data: Dict) -> Card:
+        """Restore a Card object from dict"""
+        return Card.face(card_data["rank"], card_data["suit"]).at(card_data.get("id"))
@@ -0,0 +1,90 @@
+"""
+In-process cache of live Game objects for Blackjack Roguelite
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+# Get cache configuration from environment variables
+GAME_CACHE_SIZE = int(os.getenv("GAME_CACHE_SIZE", "1024"))
+GAME_CACHE_TTL = float(os.getenv("GAME_CACHE_TTL", "300"))
+GAME_CACHE_WARMUP = int(os.getenv("GAME_CACHE_WARMUP", "0"))
+
+
+class GameCache:
+    """Bounded LRU + TTL cache keyed by game id.
+
+    Games are checked out with take(): the entry leaves the cache while a
+    request works on it and comes back with put() once the new state has
+    been saved. Two concurrent requests therefore never mutate the same
+    object, and a request that fails half way simply drops its copy so the
+    next one reloads from the database.
+
+    The cache belongs to one process: the caller checks a taken game's
+    version against the stored one before using it, since another worker
+    may have saved the game since it was put here.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def take(self, game_id: str):
+        """Remove and return a cached game, or None on a miss"""
+        with self._lock:
+            entry = self._entries.pop(game_id, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            game, stored_at = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                self.misses += 1
+                self.evictions += 1
+                return None
+
+            self.hits += 1
+            return game
+
+    def put(self, game):
+        """Store (or refresh) a game as the most recently used entry"""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[game.id] = (game, time.monotonic())
+            self._entries.move_to_end(game.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, game_id: str):
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+game_cache = GameCache(GAME_CACHE_SIZE, GAME_CACHE_TTL)
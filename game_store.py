@@ -0,0 +1,145 @@
+"""
+Redis-backed session store for in-progress Blackjack Roguelite games
+"""
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Get store configuration from environment variables
+GAME_STORE_BACKEND = os.getenv("GAME_STORE_BACKEND", "database")  # database | redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+GAME_STORE_TTL = int(os.getenv("GAME_STORE_TTL", "86400"))
+GAME_STORE_IDLE_SECONDS = int(os.getenv("GAME_STORE_IDLE_SECONDS", "1800"))
+GAME_STORE_FLUSH_INTERVAL = int(os.getenv("GAME_STORE_FLUSH_INTERVAL", "60"))
+
+ACTIVE_GAMES_KEY = "games:active"
+STATS_FIELD = "__stats__"
+
+
+class RedisGameStore:
+    """Keeps live games in Redis hashes (one field per games column).
+
+    The client is a redis.asyncio.Redis (or any compatible stand-in such as
+    fakeredis.FakeAsyncRedis); every method is a coroutine.
+
+    Rows are the plain dicts produced by Game.to_db_model() plus a stats
+    dict, so the store knows nothing about the engine. Every save refreshes
+    the key TTL and the game's score in a sorted set of last-touch
+    timestamps, which is what the idle flush walks.
+    """
+
+    def __init__(self, client, ttl: int = 86400, key_prefix: str = "game:"):
+        self.client = client
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def _key(self, game_id: str) -> str:
+        return f"{self.key_prefix}{game_id}"
+
+    @staticmethod
+    def _decode(data: Dict) -> Optional[Tuple[Dict, Dict]]:
+        if not data:
+            return None
+        row = {field: json.loads(value) for field, value in data.items()}
+        stats = row.pop(STATS_FIELD, {})
+        return row, stats
+
+    async def load(self, game_id: str) -> Optional[Tuple[Dict, Dict]]:
+        """Return (row, stats) for a live game, or None"""
+        return self._decode(await self.client.hgetall(self._key(game_id)))
+
+    async def version(self, game_id: str) -> Optional[int]:
+        """Version of a live game (one HGET), or None if it is not in the store"""
+        stored = await self.client.hget(self._key(game_id), "version")
+        return json.loads(stored) if stored is not None else None
+
+    async def save(self, row: Dict, stats: Dict, expected_version: Optional[int] = None,
+                   create: bool = False) -> Optional[bool]:
+        """Write a game; with expected_version, only if the stored version still
+        matches it (compare-and-swap). Returns False on a version conflict.
+
+        A missing hash is only written with create=True: a brand-new game, or
+        one whose database row the caller has checked is still at
+        expected_version. Otherwise None is returned, since the game may have
+        been flushed or deleted and a stale copy must not bring it back.
+        """
+        from redis.exceptions import WatchError
+
+        key = self._key(row["id"])
+        mapping = {field: json.dumps(value) for field, value in row.items()}
+        mapping[STATS_FIELD] = json.dumps(stats)
+
+        async with self.client.pipeline() as pipe:
+            try:
+                if expected_version is not None:
+                    await pipe.watch(key)
+                    stored = await pipe.hget(key, "version")
+                    # Sin hash: partida nueva, o pasada a la BD (o borrada) desde que se cargó
+                    if stored is None and not create:
+                        await pipe.unwatch()
+                        return None
+                    if stored is not None and json.loads(stored) != expected_version:
+                        await pipe.unwatch()
+                        return False
+                pipe.multi()
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.ttl)
+                pipe.zadd(ACTIVE_GAMES_KEY, {row["id"]: time.time()})
+                await pipe.execute()
+            except WatchError:
+                return False
+
+        return True
+
+    async def delete(self, game_id: str, expected_version: Optional[int] = None) -> Optional[bool]:
+        """Remove a game; with expected_version, only if the stored version
+        still matches it. Returns True if removed, False on a version conflict
+        and None if the game is not in the store.
+
+        The hash is WATCHed, so a request saving the game in the meantime
+        aborts the delete and the game stays live.
+        """
+        from redis.exceptions import WatchError
+
+        key = self._key(game_id)
+        async with self.client.pipeline() as pipe:
+            try:
+                if expected_version is not None:
+                    await pipe.watch(key)
+                    stored = await pipe.hget(key, "version")
+                    if stored is None or json.loads(stored) != expected_version:
+                        await pipe.unwatch()
+                        return None if stored is None else False
+                pipe.multi()
+                pipe.delete(key)
+                pipe.zrem(ACTIVE_GAMES_KEY, game_id)
+                removed, _ = await pipe.execute()
+            except WatchError:
+                return False
+
+        return True if removed else None
+
+    async def idle_game_ids(self, idle_seconds: int, limit: int = 100) -> List[str]:
+        cutoff = time.time() - idle_seconds
+        return await self.client.zrangebyscore(ACTIVE_GAMES_KEY, "-inf", cutoff, start=0, num=limit)
+
+    async def ping(self) -> bool:
+        try:
+            return bool(await self.client.ping())
+        except Exception:
+            return False
+
+
+def create_game_store() -> Optional[RedisGameStore]:
+    """Build the configured store; None means games go straight to the database"""
+    if GAME_STORE_BACKEND != "redis":
+        return None
+
+    import redis.asyncio
+
+    client = redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
+    return RedisGameStore(client, GAME_STORE_TTL)
+
+
+game_store = create_game_store()
@@ -0,0 +1,55 @@
+"""
+Gunicorn configuration for Blackjack Roguelite
+
+Runs the ASGI app on uvicorn workers (uvloop + httptools when installed).
+Every setting can be tuned from the environment:
+
+    gunicorn -c gunicorn.conf.py main:app
+"""
+import glob
+import multiprocessing
+import os
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8000')}"
+
+# One worker per core by default; each worker owns its own DB pool
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app once in the master so workers fork with the code loaded
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+# Graceful shutdown: finish in-flight requests before a worker exits
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+
+# Prometheus multiprocess mode: workers write their samples to files here and
+# /metrics merges them (metrics.py creates the directory)
+prometheus_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(server):
+    """Samples left by a previous run would be merged into the new one"""
+    if prometheus_dir:
+        for path in glob.glob(os.path.join(prometheus_dir, "*.db")):
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    """Workers must not share pooled connections opened by the master"""
+    from database import dispose_engines
+    dispose_engines()
+
+
+def child_exit(server, worker):
+    """Drop the live gauges (in-flight requests, pool) of a worker that exited"""
+    if prometheus_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
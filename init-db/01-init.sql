@@ -3,6 +3,7 @@
 -- Games table
 CREATE TABLE IF NOT EXISTS games (
     id VARCHAR(8) PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0,
     player_name VARCHAR(100) NOT NULL,
     player_chips INT DEFAULT 500,
     stress INT DEFAULT 0,
@@ -75,5 +76,6 @@ CREATE TABLE IF NOT EXISTS leaderboard (
 
     INDEX idx_final_chips (final_chips DESC),
     INDEX idx_profit (profit DESC),
-    INDEX idx_highest_garito (highest_garito DESC)
+    INDEX idx_highest_garito (highest_garito DESC),
+    INDEX idx_win_rate (win_rate DESC)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
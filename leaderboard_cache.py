@@ -0,0 +1,97 @@
+"""
+In-process top-N leaderboard for Blackjack Roguelite
+"""
+import bisect
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Get leaderboard configuration from environment variables
+LEADERBOARD_CACHE_SIZE = int(os.getenv("LEADERBOARD_CACHE_SIZE", "100"))
+LEADERBOARD_SYNC_INTERVAL = int(os.getenv("LEADERBOARD_SYNC_INTERVAL", "30"))
+LEADERBOARD_MAX_PAGE = int(os.getenv("LEADERBOARD_MAX_PAGE", "50"))
+
+LEADERBOARD_SORT_KEYS = ("final_chips", "profit", "highest_garito", "win_rate")
+
+
+class LeaderboardCache:
+    """Best `size` leaderboard entries for each sort key.
+
+    Entries are plain dicts that carry at least "id" and every sort key.
+    Each list is ordered by (sort key DESC, id ASC), the same order the
+    database query uses, so a page served from memory matches the SQL one.
+
+    The cache is only authoritative once load() has run. It also tracks how
+    many rows it has seen and the highest id, which lets a periodic check
+    notice rows written by other processes.
+    """
+
+    def __init__(self, size: int = 100, sort_keys: Iterable[str] = LEADERBOARD_SORT_KEYS):
+        self.size = size
+        self.sort_keys = tuple(sort_keys)
+        self._tops: Dict[str, List[Tuple]] = {key: [] for key in self.sort_keys}
+        self._lock = threading.Lock()
+        self.ready = False
+        self.row_count = 0
+        self.max_id = 0
+
+    def _insert(self, entry: Dict):
+        for key, top in self._tops.items():
+            rank = (-(entry[key] or 0), entry["id"])
+            if len(top) >= self.size and rank >= top[-1][:2]:
+                continue
+            position = bisect.bisect_left(top, rank)
+            if position < len(top) and top[position][:2] == rank:
+                continue  # already known (seen by both add() and a sync)
+            top.insert(position, rank + (entry,))
+            del top[self.size:]
+
+    def load(self, entries_by_key: Dict[str, List[Dict]], row_count: int, max_id: int):
+        """Replace the contents with the top rows fetched per sort key"""
+        with self._lock:
+            self._tops = {key: [] for key in self.sort_keys}
+            # The union of the per-key tops holds every key's true top N
+            unique = {entry["id"]: entry for entries in entries_by_key.values() for entry in entries}
+            for entry in unique.values():
+                self._insert(entry)
+            self.row_count = row_count
+            self.max_id = max_id
+            self.ready = True
+
+    def add(self, entry: Dict):
+        """Record a newly written leaderboard row"""
+        with self._lock:
+            self._insert(entry)
+            self.row_count += 1
+            self.max_id = max(self.max_id, entry["id"])
+
+    def page(self, sort_key: str, limit: int, after_id: Optional[int] = None) -> Optional[List[Dict]]:
+        """Up to `limit` entries following the entry `after_id` (from the
+        start if None), or None if the answer may lie beyond the cached top"""
+        if not self.ready or sort_key not in self._tops:
+            return None
+
+        with self._lock:
+            top = self._tops[sort_key]
+            start = 0
+            if after_id is not None:
+                start = next((i + 1 for i, item in enumerate(top) if item[1] == after_id), None)
+                if start is None:
+                    return None
+            entries = [entry for _, _, entry in top[start:start + limit]]
+            # Short page: fine only if the whole table fits in the cache
+            if len(entries) < limit and self.row_count > len(top):
+                return None
+            return entries
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "size": self.size,
+                "row_count": self.row_count,
+                "max_id": self.max_id,
+            }
+
+
+leaderboard_cache = LeaderboardCache(LEADERBOARD_CACHE_SIZE)
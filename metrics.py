@@ -0,0 +1,175 @@
+"""
+Prometheus metrics for Blackjack Roguelite
+
+GET /metrics exposes:
+    http_request_duration_seconds   latency by method, route template and status
+    http_requests_in_progress       requests being served
+    db_pool_checked_out             connections lent out by the pool
+    db_pool_overflow                connections open beyond pool_size
+    db_pool_wait_seconds            time to get a connection (free one or new)
+    game_phase_duration_seconds     load / engine / to_dict / save time per route
+    game_rounds_total, game_cheats_total, game_cheats_detected_total,
+    game_overs_total                game events per garito
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to a directory of its own:
+every worker writes its samples there and /metrics merges them
+(gunicorn.conf.py empties it on start and drops the gauges of dead
+workers). Without it, each process reports only itself.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Get metrics configuration from environment variables
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# In multiprocess mode every metric opens its file there as it is created
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# Phases and pool waits are much shorter than whole requests
+FINE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+)
+IN_FLIGHT = Gauge("http_requests_in_progress", "HTTP requests being served", multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections lent out by the pool", multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size", multiprocess_mode="livesum")
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds", "Time to get a connection from the pool", buckets=FINE_BUCKETS)
+PHASE_LATENCY = Histogram(
+    "game_phase_duration_seconds", "Time spent in each phase of a game request", ["route", "phase"],
+    buckets=FINE_BUCKETS,
+)
+ROUNDS = Counter("game_rounds_total", "Rounds played", ["garito"])
+CHEATS = Counter("game_cheats_total", "Cheats attempted", ["garito"])
+CHEATS_DETECTED = Counter("game_cheats_detected_total", "Cheats caught by the dealer", ["garito"])
+GAME_OVERS = Counter("game_overs_total", "Runs that ended", ["garito"])
+
+# Phase durations of the request in flight, set by MetricsMiddleware
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_phases", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block as one phase of the current request (no-op outside one)"""
+    timings = _phases.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: route latency, in-flight count and phase timings"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timings: Dict[str, float] = {}
+        token = _phases.set(timings)
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            _phases.reset(token)
+            # Route template, not the path: one series per endpoint, not per game
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            if route != "/metrics":
+                REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+                for name, seconds in timings.items():
+                    PHASE_LATENCY.labels(route, name).observe(seconds)
+
+
+def instrument_pool(engine):
+    """Pool gauges and wait time for a (sync) Engine; call it in each worker,
+    after the pool inherited from the master has been disposed.
+
+    Only public hooks: the checkout/checkin pool events (registered on the
+    engine, so they outlive pool recreation) and, for the wait, the timed
+    pool classes of database.pool_options().
+    """
+    from sqlalchemy import event
+
+    from database import pool_wait_observers
+
+    pool = engine.pool
+    size = pool.size() if hasattr(pool, "size") else None
+    checked_out = 0
+
+    # Counted here: the checkin event fires before the pool takes the
+    # connection back, so pool.checkedout() would still include it
+    def update(delta: int):
+        nonlocal checked_out
+        checked_out += delta
+        DB_POOL_CHECKED_OUT.set(checked_out)
+        DB_POOL_OVERFLOW.set(max(0, checked_out - size) if size is not None else 0)
+
+    event.listen(engine, "checkout", lambda *_: update(1))
+    event.listen(engine, "checkin", lambda *_: update(-1))
+
+    if DB_POOL_WAIT.observe not in pool_wait_observers:
+        pool_wait_observers.append(DB_POOL_WAIT.observe)
+
+
+def game_counters(game) -> Tuple[int, int, int, int, bool]:
+    """What record_game_events() compares: garito, rounds, cheats, detections, over"""
+    return game.current_garito, game.rounds, game.cheats_used, game.cheats_detected, game.status.value == "game_over"
+
+
+def record_game_events(game, before: Tuple[int, int, int, int, bool]):
+    """Count what happened to a game since game_counters(), under the garito it was in"""
+    if not METRICS_ENABLED:
+        return
+    garito, rounds, cheats, detected, over = before
+    label = str(garito)
+    if game.rounds > rounds:
+        ROUNDS.labels(label).inc(game.rounds - rounds)
+    if game.cheats_used > cheats:
+        CHEATS.labels(label).inc(game.cheats_used - cheats)
+    if game.cheats_detected > detected:
+        CHEATS_DETECTED.labels(label).inc(game.cheats_detected - detected)
+    if not over and game.status.value == "game_over":
+        GAME_OVERS.labels(label).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition body and content type: every worker's samples in multiprocess mode"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
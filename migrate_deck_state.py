@@ -0,0 +1,60 @@
+"""
+Migration: rewrite legacy deck_state rows into the compact deck codec.
+
+Older rows store the shoe as a JSON list of {"rank", "suit", "id"} dicts.
+This script re-encodes them with encode_deck() so they take a few hundred
+bytes instead of several kilobytes. Rows already in the compact format are
+skipped, so it is safe to run more than once.
+
+Usage:
+    python migrate_deck_state.py [--batch-size 200] [--dry-run]
+"""
+import argparse
+
+from database import SessionLocal
+from models import GameModel
+from engine import decode_deck, encode_deck
+
+
+def migrate(batch_size: int = 200, dry_run: bool = False) -> int:
+    """Re-encode every legacy deck_state, returns the number of rows migrated"""
+    db = SessionLocal()
+    migrated = 0
+    last_id = ""
+    try:
+        while True:
+            rows = (
+                db.query(GameModel)
+                .filter(GameModel.id > last_id)
+                .order_by(GameModel.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            for db_game in rows:
+                if isinstance(db_game.deck_state, list):
+                    db_game.deck_state = encode_deck(decode_deck(db_game.deck_state))
+                    migrated += 1
+            last_id = rows[-1].id
+
+            if dry_run:
+                db.rollback()
+            else:
+                db.commit()
+    finally:
+        db.close()
+
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact legacy deck_state rows")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    count = migrate(args.batch_size, args.dry_run)
+    suffix = " (dry run)" if args.dry_run else ""
+    print(f"Migrated {count} games to deck codec v1{suffix}")
@@ -1,7 +1,7 @@
 """
 SQLAlchemy models for Blackjack Roguelite persistence
 """
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -12,6 +12,8 @@ class GameModel(Base):
     __tablename__ = "games"
 
     id = Column(String(8), primary_key=True, index=True)
+    # Optimistic concurrency: every save is UPDATE ... WHERE version = <loaded>
+    version = Column(Integer, nullable=False, default=0)
     player_name = Column(String(100), nullable=False)
     player_chips = Column(Integer, default=500)
     stress = Column(Integer, default=0)
@@ -78,6 +80,9 @@ class StatsModel(Base):
 class LeaderboardModel(Base):
     """Historical leaderboard entries"""
     __tablename__ = "leaderboard"
+    # Fetch id/created_at with the INSERT (RETURNING) so the new row can go
+    # straight into the in-memory leaderboard without lazy loads
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     player_name = Column(String(100), nullable=False)
@@ -91,3 +96,12 @@ class LeaderboardModel(Base):
     cheats_used = Column(Integer, default=0)
     cheats_detected = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # One index per leaderboard sort key; InnoDB appends the primary key, so
+    # each one is ordered (key DESC, id ASC) like the keyset pagination
+    __table_args__ = (
+        Index("idx_final_chips", final_chips.desc()),
+        Index("idx_profit", profit.desc()),
+        Index("idx_highest_garito", highest_garito.desc()),
+        Index("idx_win_rate", win_rate.desc()),
+    )
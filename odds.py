@@ -0,0 +1,149 @@
+"""
+Exact blackjack odds for Blackjack Roguelite
+"""
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+# Get odds configuration from environment variables
+ODDS_CACHE_SIZE = int(os.getenv("ODDS_CACHE_SIZE", "200000"))
+
+# Card points as the engine counts them (11 = ace). A pool of unseen cards is
+# a tuple of counts indexed by points - 2, so suits and 10/J/Q/K collapse.
+POINTS = tuple(range(2, 12))
+ACE = 11
+
+
+def rank_counts(points: Iterable[int]) -> Tuple[int, ...]:
+    """Pool tuple for the given card points"""
+    counts = [0] * len(POINTS)
+    for p in points:
+        counts[p - 2] += 1
+    return tuple(counts)
+
+
+def _add(hard: int, has_ace: bool, p: int) -> Tuple[int, bool]:
+    """Hand state (total counting aces as 1, any ace) after drawing p"""
+    return hard + (1 if p == ACE else p), has_ace or p == ACE
+
+
+def _value(hard: int, has_ace: bool) -> int:
+    # Same result as Hand.calculate_value: at most one ace can count as 11
+    return hard + 10 if has_ace and hard + 10 <= 21 else hard
+
+
+def _hand(points: Iterable[int]) -> Tuple[int, bool]:
+    hard, has_ace = 0, False
+    for p in points:
+        hard, has_ace = _add(hard, has_ace, p)
+    return hard, has_ace
+
+
+def _outcome(value: int, stand_value: int) -> Tuple[float, ...]:
+    """Outcome vector (totals stand_value..21, then bust) for a final hand"""
+    vector = [0.0] * (23 - stand_value)
+    vector[-1 if value > 21 else max(value, stand_value) - stand_value] = 1.0
+    return tuple(vector)
+
+
+@lru_cache(maxsize=ODDS_CACHE_SIZE)
+def _dealer_outcomes(pool: Tuple[int, ...], hard: int, has_ace: bool, stand_value: int) -> Tuple[float, ...]:
+    """Final-total distribution of a dealer hand that keeps drawing from pool.
+
+    Keyed by the remaining counts, so every query that reaches the same
+    (pool, hand) state, within one request or across requests on the same
+    shoe, reuses the result.
+    """
+    value = _value(hard, has_ace)
+    total = sum(pool)
+    # An empty pool cannot happen with a real shoe (the engine reshuffles first)
+    if value >= stand_value or not total:
+        return _outcome(value, stand_value)
+
+    acc = [0.0] * (23 - stand_value)
+    counts = list(pool)
+    for i, count in enumerate(pool):
+        if not count:
+            continue
+        counts[i] -= 1
+        sub = _dealer_outcomes(tuple(counts), *_add(hard, has_ace, POINTS[i]), stand_value)
+        counts[i] += 1
+        weight = count / total
+        for j, p in enumerate(sub):
+            acc[j] += weight * p
+    return tuple(acc)
+
+
+def _draw_known(hard: int, has_ace: bool, upcoming: Sequence[int], stand_value: int) -> Tuple[int, bool]:
+    """Let the dealer take the already known upcoming cards it needs"""
+    for p in upcoming:
+        if _value(hard, has_ace) >= stand_value:
+            break
+        hard, has_ace = _add(hard, has_ace, p)
+    return hard, has_ace
+
+
+def dealer_distribution(pool: Tuple[int, ...], dealer_points: Sequence[int], hole_hidden: bool,
+                        upcoming: Sequence[int] = (), hole_pool: Optional[Tuple[int, ...]] = None,
+                        stand_value: int = 17) -> Dict[str, float]:
+    """Probability of each dealer final total if the player stands now.
+
+    pool: unseen cards the dealer will draw from (known upcoming cards
+        already taken out).
+    dealer_points: dealer cards the player can see.
+    hole_hidden: the hole card is still face down; it is drawn from
+        hole_pool, or from pool itself when hole_pool is None.
+    upcoming: points of the next cards of the deck, if known (peeked).
+    """
+    hard, has_ace = _hand(dealer_points)
+    if hole_hidden:
+        source = pool if hole_pool is None else hole_pool
+        total = sum(source)
+        acc = [0.0] * (23 - stand_value)
+        counts = list(pool)
+        for i, count in enumerate(source):
+            if not count:
+                continue
+            if hole_pool is None:
+                counts[i] -= 1
+            state = _draw_known(*_add(hard, has_ace, POINTS[i]), upcoming, stand_value)
+            sub = _dealer_outcomes(tuple(counts), *state, stand_value)
+            if hole_pool is None:
+                counts[i] += 1
+            for j, p in enumerate(sub):
+                acc[j] += count / total * p
+        outcomes = acc
+    else:
+        state = _draw_known(hard, has_ace, upcoming, stand_value)
+        outcomes = _dealer_outcomes(pool, *state, stand_value)
+
+    result = {str(total): p for total, p in zip(range(stand_value, 22), outcomes)}
+    result["bust"] = outcomes[-1]
+    return result
+
+
+def dealer_blackjack_chance(pool: Tuple[int, ...], upcard: int) -> float:
+    """Chance that a two-card dealer hand with a hidden hole card is a blackjack"""
+    total = sum(pool)
+    if not total or upcard not in (10, ACE):
+        return 0.0
+    return pool[(ACE if upcard == 10 else 10) - 2] / total
+
+
+def bust_chance(pool: Tuple[int, ...], player_points: Sequence[int], upcoming: Sequence[int] = ()) -> float:
+    """Chance that one more card busts the player's hand"""
+    hard, has_ace = _hand(player_points)
+    if upcoming:
+        return 1.0 if _value(*_add(hard, has_ace, upcoming[0])) > 21 else 0.0
+
+    total = sum(pool)
+    if not total:
+        return 0.0
+    # An ace always fits (it can count as 1) once the hand itself is not bust
+    busting = sum(count for p, count in zip(POINTS, pool) if hard + (1 if p == ACE else p) > 21)
+    return busting / total
+
+
+def odds_cache_stats() -> Dict:
+    info = _dealer_outcomes.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
@@ -0,0 +1,170 @@
+"""
+Per-request SQL statement counts for Blackjack Roguelite
+
+Engine events count and time every statement; QueryStatsMiddleware
+collects them per request and:
+    - adds X-DB-Queries (statements) and X-DB-Time (milliseconds) to the response
+    - logs one JSON line per request on the "blackjack.sql" logger when
+      DB_QUERY_LOG=true
+    - logs a warning with the statements when a route goes over its query
+      budget, or raises QueryBudgetExceeded with QUERY_BUDGET_STRICT=true
+      (test mode: the error reaches the test client)
+
+assert_query_budget() checks any block of code the same way.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Get query stats configuration from environment variables
+DB_QUERY_LOG = os.getenv("DB_QUERY_LOG", "false").lower() == "true"
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+
+logger = logging.getLogger("blackjack.sql")
+if DB_QUERY_LOG:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More SQL statements than allowed"""
+
+
+class QueryStats:
+    """Statements run inside one request or assert_query_budget() block"""
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements: List[str] = []
+
+    def add(self, statement: str, seconds: float):
+        stats = self
+        # Nested blocks (a budget around a test client call) see the request's statements too
+        while stats is not None:
+            stats.queries += 1
+            stats.seconds += seconds
+            stats.statements.append(statement)
+            stats = stats.parent
+
+    def check(self, budget: int, label: str):
+        if self.queries > budget:
+            listing = "\n".join(f"  {statement}" for statement in self.statements)
+            raise QueryBudgetExceeded(f"{label}: {self.queries} SQL statements, budget {budget}\n{listing}")
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append((context, time.perf_counter()))
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    _, start = conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement, time.perf_counter() - start)
+
+
+def _on_error(exception_context):
+    # A failed statement never reaches after_cursor_execute: close its entry
+    # here (it still counts), or the connection keeps it once back in the pool.
+    # Errors raised before the cursor ran have no entry of their own.
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts and starts[-1][0] is exception_context.execution_context:
+        _, start = starts.pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.add(exception_context.statement, time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Count the statements of a (sync) Engine; for an AsyncEngine pass .sync_engine"""
+    from sqlalchemy import event
+
+    if not event.contains(engine, "before_cursor_execute", _before_execute):
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        event.listen(engine, "after_cursor_execute", _after_execute)
+        event.listen(engine, "handle_error", _on_error)
+
+
+@contextmanager
+def count_queries():
+    """Collect the statements run inside the block (in this task)"""
+    stats = QueryStats(_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_query_budget(budget: int, label: str = "block"):
+    """Fail with QueryBudgetExceeded if the block runs more than budget statements"""
+    with count_queries() as stats:
+        yield stats
+    stats.check(budget, label)
+
+
+class QueryStatsMiddleware:
+    """Plain ASGI middleware: statement count and time of every HTTP request.
+
+    budgets maps "METHOD /route/template" to the most statements the route
+    may run; routes without an entry are not checked.
+    """
+
+    def __init__(self, app, budgets: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.budgets = budgets or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Everything the endpoint ran is in by the time the response starts
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.queries).encode()))
+                headers.append((b"x-db-time", f"{stats.seconds * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with count_queries() as stats:
+            await self.app(scope, receive, send_with_headers)
+
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        endpoint = f"{scope['method']} {route}"
+        if DB_QUERY_LOG:
+            logger.info(json.dumps({
+                "event": "db_queries",
+                "endpoint": endpoint,
+                "status": status,
+                "queries": stats.queries,
+                "db_ms": round(stats.seconds * 1000, 2),
+            }))
+
+        budget = self.budgets.get(endpoint)
+        if budget is not None:
+            try:
+                stats.check(budget, endpoint)
+            except QueryBudgetExceeded as e:
+                if QUERY_BUDGET_STRICT:
+                    raise
+                logger.warning(str(e))
@@ -0,0 +1,396 @@
+"""
+Full-run simulator: bots play complete roguelite runs against the engine.
+
+Each run is a real Game, from Game.__init__ until GAME_OVER or a win in
+the last garito, driven by a bot policy that decides the bet, the play,
+when to cheat, which consumables to use, what to buy in the shop and
+whether to advance. Runs are fanned out over a ProcessPoolExecutor in
+chunks and only the aggregates travel back, so thousands of runs take
+seconds and nothing touches FastAPI or the database.
+
+The last garito has no chips_to_advance, so "winning" it means reaching
+--win-chips there. Runs that hit --max-rounds are reported as timeouts.
+
+Output: survival per garito (share of runs that reach and clear each one),
+share of runs still alive and chips percentiles every --checkpoint rounds,
+and attempts and detection rate per cheat.
+
+Policies are classes with the hooks of Policy. Built-ins: cautious,
+basic and cheater; any other class can be passed as module:Class.
+
+Usage:
+    python run_simulator.py [--runs 2000] [--policy basic] [--difficulty normal] [--workers 8] [--json]
+    python run_simulator.py --policy cheater --policy basic --runs 5000
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from engine import (
+    CONFIG, DIFFICULTY_SETTINGS, GARITOS, ITEMS, Card, Game, GameStatus, PlayerAction, strategy_rules,
+)
+from strategy import strategy_tables
+
+LAST_GARITO = max(GARITOS)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# POLÍTICAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class Policy:
+    """Bot base: apuesta mínima, estrategia básica, sin trampas ni compras"""
+    name = "base"
+
+    def bet(self, game: Game) -> int:
+        return game.get_garito()["min_bet"]
+
+    def action(self, game: Game) -> PlayerAction:
+        # Tabla de estrategia básica del garito si está cargada; si no (o si una
+        # trampa dejó la mano pasada en juego), la regla de siempre
+        if strategy_tables.ready:
+            action = game.hint()["action"]
+            if action:
+                return PlayerAction(action)
+        value = game.player_hand.calculate_value()
+        if value in (10, 11) and game.player_hand.can_double() and game.player_chips >= game.current_bet:
+            return PlayerAction.DOUBLE
+        return PlayerAction.HIT if value < 17 else PlayerAction.STAND
+
+    def cheat(self, game: Game) -> Optional[str]:
+        """Trampa a intentar antes de jugar la mano (una por ronda como mucho)"""
+        return None
+
+    def use_items(self, game: Game) -> List[str]:
+        """Consumibles a usar antes de apostar"""
+        return []
+
+    def shop(self, game: Game) -> List[str]:
+        """Objetos a comprar, en orden, al entrar en un garito nuevo"""
+        return []
+
+    def advance(self, game: Game) -> bool:
+        return True
+
+
+class CautiousBot(Policy):
+    """Apuesta mínima, no hace trampas, compra whiskey y lo bebe con estrés alto"""
+    name = "cautious"
+
+    def use_items(self, game: Game) -> List[str]:
+        if game.stress >= 60 and game.inventory.items.get("whiskey"):
+            return ["whiskey"]
+        return []
+
+    def shop(self, game: Game) -> List[str]:
+        return ["whiskey", "whiskey"]
+
+
+class BasicBot(CautiousBot):
+    """Apuesta un 5% de las fichas y compra mejoras permanentes si le sobran"""
+    name = "basic"
+    bet_fraction = 0.05
+    upgrades = ("anillo_sello", "herradura", "amuleto_diablo", "trebol")
+
+    def bet(self, game: Game) -> int:
+        garito = game.get_garito()
+        return max(garito["min_bet"], min(garito["max_bet"], int(game.player_chips * self.bet_fraction)))
+
+    def shop(self, game: Game) -> List[str]:
+        # Reserva: veinte apuestas mínimas del garito nuevo
+        budget = game.player_chips - 20 * game.get_garito()["min_bet"]
+        wanted = []
+        for item_id in self.upgrades:
+            if item_id not in game.inventory.items and ITEMS[item_id]["price"] <= budget:
+                wanted.append(item_id)
+                budget -= ITEMS[item_id]["price"]
+        return wanted + super().shop(game)
+
+
+class CheaterBot(BasicBot):
+    """Hace trampas en manos dudosas si el riesgo y el estrés lo permiten"""
+    name = "cheater"
+    max_detection = 0.50
+    max_stress = 55
+    upgrades = ("gafas_oscuras", "anillo_sello", "herradura")
+    cheat_order = ("peek_next_card", "swap_card", "mark_deck")
+
+    def cheat(self, game: Game) -> Optional[str]:
+        if game.stress >= self.max_stress or not 12 <= game.player_hand.calculate_value() <= 16:
+            return None
+        # La trampa disponible con menos riesgo, si no pasa del límite
+        chances = {
+            cheat_id: game.calculate_detection_chance(cheat_id)
+            for cheat_id in self.cheat_order if game.inventory.can_use_cheat(cheat_id)
+        }
+        best = min(chances, key=chances.get, default=None)
+        return best if best and chances[best] <= self.max_detection else None
+
+    def action(self, game: Game) -> PlayerAction:
+        # Con la próxima carta a la vista (y sin rebarajar antes), pedir solo si no nos pasamos
+        known = game.next_card_peeked or (game.peeked_cards[0] if game.peeked_cards else None)
+        if known and len(game.deck.cards) >= 20 and known["id"] == game.deck.peek_next()["id"]:
+            card = Card.face(known["rank"], known["suit"])
+            points = 1 if card.rank == "A" else card.value()
+            if game.player_hand.hard_total + points <= 21 and game.player_hand.calculate_value() < 19:
+                return PlayerAction.HIT
+            return PlayerAction.STAND
+        return super().action(game)
+
+    def use_items(self, game: Game) -> List[str]:
+        if game.stress >= 40 and game.inventory.items.get("whiskey"):
+            return ["whiskey"]
+        return []
+
+    def shop(self, game: Game) -> List[str]:
+        return super().shop(game) + ["whiskey"]
+
+
+POLICIES = {policy.name: policy for policy in (CautiousBot, BasicBot, CheaterBot)}
+
+
+def load_policy(name: str) -> Policy:
+    """Política por nombre (cautious, basic, cheater) o por ruta module:Class"""
+    if name in POLICIES:
+        return POLICIES[name]()
+    module_name, _, class_name = name.partition(":")
+    if not class_name:
+        raise ValueError(f"Política desconocida: {name}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PARTIDAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def play_run(policy: Policy, difficulty: str, seed: int, max_rounds: int, win_chips: int, checkpoint: int) -> Dict:
+    """Juega una partida completa y devuelve su resumen"""
+    # El engine tira de random para la detección y para la semilla del mazo
+    random.seed(seed)
+    game = Game(f"run-{seed}", policy.name, difficulty)
+    reached = {1: 0}
+    chips_trace = [game.player_chips]
+    cheats: Dict[str, List[int]] = {}
+    cheated_round = -1
+    outcome = None
+
+    while outcome is None:
+        if game.status == GameStatus.GAME_OVER:
+            # Mismo orden que _end_round: primero las fichas, luego el estrés
+            broke = game.player_chips < game.get_garito().get("min_bet", CONFIG["minimum_bet"])
+            outcome = "broke" if broke else "collapse"
+        elif game.rounds >= max_rounds:
+            outcome = "timeout"
+        elif game.status == GameStatus.WAITING_FOR_BET:
+            if game.current_garito == LAST_GARITO and game.player_chips >= win_chips:
+                outcome = "won"
+                continue
+            for item_id in policy.use_items(game):
+                game.use_item(item_id)
+            try:
+                game.place_bet(policy.bet(game))
+            except ValueError:
+                # Sin fichas para la mínima tras la tienda: el engine no lo marca como game over
+                outcome = "broke"
+        elif game.status == GameStatus.PLAYER_TURN:
+            # Una trampa por mano como mucho, salga bien o no
+            cheat_id = policy.cheat(game) if cheated_round != game.rounds else None
+            if cheat_id:
+                cheated_round = game.rounds
+                result = game.attempt_cheat(cheat_id)
+                if "result" in result:
+                    stats = cheats.setdefault(cheat_id, [0, 0])
+                    stats[0] += 1
+                    stats[1] += result["result"] == "detected"
+                continue
+            game.player_action(policy.action(game))
+        elif game.status == GameStatus.ROUND_COMPLETE:
+            if game.rounds % checkpoint == 0:
+                chips_trace.append(game.player_chips)
+            if game.new_round()["can_advance_garito"] and game.current_garito < LAST_GARITO and policy.advance(game):
+                game.advance_garito()
+                reached[game.current_garito] = game.rounds
+        elif game.status == GameStatus.SHOP:
+            for item_id in policy.shop(game):
+                game.buy_item(item_id)
+            game.leave_shop()
+        else:
+            raise RuntimeError(f"Estado inesperado: {game.status}")
+
+    return {
+        "outcome": outcome,
+        "garito": game.current_garito,
+        "reached": reached,
+        "rounds": game.rounds,
+        "chips": chips_trace,
+        "final_chips": game.player_chips,
+        "cheats": cheats,
+    }
+
+
+def _init_worker():
+    strategy_tables.open(strategy_rules())
+
+
+def _play_chunk(policy_name: str, difficulty: str, seeds: List[int], max_rounds: int, win_chips: int,
+                checkpoint: int) -> Dict:
+    """Un lote de partidas en un proceso; solo vuelven los agregados"""
+    policy = load_policy(policy_name)
+    points = max_rounds // checkpoint + 1
+    agg = {
+        "runs": 0,
+        "outcomes": {},
+        "reached": {level: 0 for level in GARITOS},
+        "cleared": {level: 0 for level in GARITOS},
+        "rounds_to_reach": {level: [] for level in GARITOS},
+        "alive": [0] * points,
+        "chips": [[] for _ in range(points)],
+        "cheats": {},
+    }
+    for seed in seeds:
+        run = play_run(policy, difficulty, seed, max_rounds, win_chips, checkpoint)
+        agg["runs"] += 1
+        agg["outcomes"][run["outcome"]] = agg["outcomes"].get(run["outcome"], 0) + 1
+        for level, at_round in run["reached"].items():
+            agg["reached"][level] += 1
+            agg["rounds_to_reach"][level].append(at_round)
+            if level < run["garito"] or run["outcome"] == "won":
+                agg["cleared"][level] += 1
+        alive_points = len(run["chips"]) if run["outcome"] != "won" else points
+        for point in range(points):
+            # Partidas terminadas: se quedan con sus fichas finales
+            chips = run["chips"][point] if point < len(run["chips"]) else run["final_chips"]
+            agg["chips"][point].append(chips)
+            agg["alive"][point] += point < alive_points
+        for cheat_id, (attempts, detected) in run["cheats"].items():
+            stats = agg["cheats"].setdefault(cheat_id, [0, 0])
+            stats[0] += attempts
+            stats[1] += detected
+    return agg
+
+
+def _merge(total: Optional[Dict], part: Dict) -> Dict:
+    if total is None:
+        return part
+    total["runs"] += part["runs"]
+    for outcome, count in part["outcomes"].items():
+        total["outcomes"][outcome] = total["outcomes"].get(outcome, 0) + count
+    for level in GARITOS:
+        total["reached"][level] += part["reached"][level]
+        total["cleared"][level] += part["cleared"][level]
+        total["rounds_to_reach"][level] += part["rounds_to_reach"][level]
+    for point, chips in enumerate(part["chips"]):
+        total["chips"][point] += chips
+        total["alive"][point] += part["alive"][point]
+    for cheat_id, (attempts, detected) in part["cheats"].items():
+        stats = total["cheats"].setdefault(cheat_id, [0, 0])
+        stats[0] += attempts
+        stats[1] += detected
+    return total
+
+
+def _percentile(values: List[int], q: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(agg: Dict, policy_name: str, difficulty: str, checkpoint: int) -> Dict:
+    runs = agg["runs"]
+    return {
+        "policy": policy_name,
+        "difficulty": difficulty,
+        "runs": runs,
+        "outcomes": {outcome: count / runs for outcome, count in sorted(agg["outcomes"].items())},
+        "garitos": {
+            level: {
+                "reached": agg["reached"][level] / runs,
+                "cleared": agg["cleared"][level] / agg["reached"][level] if agg["reached"][level] else None,
+                "median_round_reached": _percentile(agg["rounds_to_reach"][level], 0.5)
+                if agg["rounds_to_reach"][level] else None,
+            }
+            for level in GARITOS
+        },
+        "timeline": [
+            {
+                "round": point * checkpoint,
+                "alive": agg["alive"][point] / runs,
+                "chips_p10": _percentile(chips, 0.1),
+                "chips_p50": _percentile(chips, 0.5),
+                "chips_p90": _percentile(chips, 0.9),
+            }
+            for point, chips in enumerate(agg["chips"])
+        ],
+        "cheats": {
+            cheat_id: {"attempts": attempts, "detection_rate": detected / attempts if attempts else None}
+            for cheat_id, (attempts, detected) in sorted(agg["cheats"].items())
+        },
+    }
+
+
+def simulate_runs(policy_name: str, difficulty: str, runs: int, seed: int = 1, workers: Optional[int] = None,
+                  max_rounds: int = 1500, win_chips: int = 25000, checkpoint: int = 50, chunk: int = 25) -> Dict:
+    """Reparte las partidas entre procesos y agrega los resultados"""
+    load_policy(policy_name)  # falla pronto si la política no existe
+    seeds = [seed * 1_000_003 + i for i in range(runs)]
+    chunks = [seeds[i:i + chunk] for i in range(0, runs, chunk)]
+    total = None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [
+            pool.submit(_play_chunk, policy_name, difficulty, part, max_rounds, win_chips, checkpoint)
+            for part in chunks
+        ]
+        for future in futures:
+            total = _merge(total, future.result())
+    return summarize(total, policy_name, difficulty, checkpoint)
+
+
+def _print_summary(summary: Dict, every: int):
+    outcomes = "  ".join(f"{outcome} {share*100:5.1f}%" for outcome, share in summary["outcomes"].items())
+    print(f"\n{summary['policy']} / {summary['difficulty']}: {summary['runs']} partidas  {outcomes}")
+    for level, garito in summary["garitos"].items():
+        cleared = "-" if garito["cleared"] is None else f"{garito['cleared']*100:5.1f}%"
+        median = "-" if garito["median_round_reached"] is None else garito["median_round_reached"]
+        print(f"  garito {level}  llegan {garito['reached']*100:5.1f}%  lo superan {cleared:>6}  ronda mediana {median}")
+    for point in summary["timeline"][::every]:
+        print(f"  ronda {point['round']:5d}  vivas {point['alive']*100:5.1f}%  "
+              f"fichas p10 {point['chips_p10']:7d}  p50 {point['chips_p50']:7d}  p90 {point['chips_p90']:7d}")
+    for cheat_id, cheat in summary["cheats"].items():
+        rate = "-" if cheat["detection_rate"] is None else f"{cheat['detection_rate']*100:5.1f}%"
+        print(f"  trampa {cheat_id:<15} intentos {cheat['attempts']:7d}  detectadas {rate}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partidas completas con bots para balancear ITEMS y TRAMPAS")
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--policy", action="append", default=[], help=f"{', '.join(POLICIES)} o module:Class")
+    parser.add_argument("--difficulty", choices=sorted(DIFFICULTY_SETTINGS), action="append", default=[])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-rounds", type=int, default=1500)
+    parser.add_argument("--win-chips", type=int, default=25000, help="fichas que ganan la partida en el último garito")
+    parser.add_argument("--checkpoint", type=int, default=50, help="rondas entre muestras de fichas")
+    parser.add_argument("--chunk", type=int, default=25, help="partidas por tarea del pool")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    start = time.perf_counter()
+    for policy_name in args.policy or ["basic"]:
+        for difficulty in args.difficulty or ["normal"]:
+            summary = simulate_runs(
+                policy_name, difficulty, args.runs, seed=args.seed, workers=args.workers,
+                max_rounds=args.max_rounds, win_chips=args.win_chips, checkpoint=args.checkpoint, chunk=args.chunk,
+            )
+            results.append(summary)
+            if not args.json:
+                _print_summary(summary, every=max(1, len(summary["timeline"]) // 10))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"\n{sum(r['runs'] for r in results)} partidas en {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,474 @@
+"""
+Vectorized round simulator for balancing GARITOS and DIFFICULTY_SETTINGS.
+
+Plays many independent players at once, one NumPy array element per
+player, with a fixed strategy (double on the given totals, hit below
+stand_on) and flat bets. Every payout figure comes from the engine's own
+rule functions (win_bonus, blackjack_base_payout, streak_multiplier,
+has_rule), evaluated once per configuration into lookup tables, so the
+arrays only ever index exact engine results.
+
+Each player arrives with the chips needed to leave the previous garito
+(or the difficulty's starting chips in the first one) and keeps going
+until they can advance (chips_to_advance), go broke or collapse from
+stress. Cheats and shop purchases are not played; passive items can be
+given up front with --item.
+
+Cards come from an infinite shoe unless explicit card streams are passed,
+which is what the cross-check does: it records the cards dealt by real
+Game objects and checks that the simulator reproduces every round.
+
+Usage:
+    python simulator.py [--players 20000] [--rounds 200] [--garito 3] [--difficulty hard] [--json]
+    python simulator.py --cross-check [--players 300] [--rounds 80]
+"""
+import argparse
+import json
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from engine import (
+    CONFIG, DIFFICULTY_SETTINGS, GARITOS, RANKS, Card, Game, GameStatus, PlayerAction, PlayerInventory,
+    blackjack_base_payout, has_rule, streak_multiplier, win_bonus,
+)
+
+ACE = RANKS.index("A")
+# Puntos de cada rango contando el as como 1 (el as "blando" se suma aparte)
+HARD_POINTS = np.array([1 if rank == "A" else Card.face(rank, "hearts").value() for rank in RANKS], dtype=np.int64)
+
+# Cartas por jugador y ronda que puede llegar a consumir una mano (con margen)
+MAX_ROUND_CARDS = 32
+
+WIN, BLACKJACK, LOSS, PUSH = 1, 2, 3, 4
+RESULT_CODES = {"win": WIN, "blackjack": BLACKJACK, "loss": LOSS, "push": PUSH}
+
+PLAYING, ADVANCED, BROKE, COLLAPSED = 0, 1, 2, 3
+STREAK_LEVELS = 6  # 0..4 y 5+ (el engine no distingue rachas mayores de 5)
+
+
+def _hand_value(hard: np.ndarray, has_ace: np.ndarray) -> np.ndarray:
+    """Hand.calculate_value(): un as cuenta 11 si no se pasa de 21"""
+    return np.where(has_ace & (hard + 10 <= 21), hard + 10, hard)
+
+
+def arrival_chips(garito_level: int, difficulty: str) -> int:
+    """Fichas con las que se llega al garito: las justas para salir del anterior"""
+    if garito_level > 1 and GARITOS[garito_level - 1].get("chips_to_advance"):
+        return GARITOS[garito_level - 1]["chips_to_advance"]
+    return DIFFICULTY_SETTINGS[difficulty]["starting_chips"]
+
+
+def passive_effects_for(items: Iterable[str]) -> Dict:
+    """Efectos pasivos de un inventario con estos objetos"""
+    inventory = PlayerInventory()
+    for item_id in items:
+        inventory.add_item(item_id)
+    return inventory.passive_effects
+
+
+class RoundSimulator:
+    """Independent players of one garito/difficulty, advanced one round at a time"""
+
+    def __init__(
+        self,
+        garito_level: int,
+        difficulty: str,
+        players: int,
+        passive_effects: Optional[Dict] = None,
+        stand_on: int = 17,
+        double_totals: Iterable[int] = (10, 11),
+        bet: Optional[int] = None,
+        starting_chips: Optional[int] = None,
+    ):
+        garito = GARITOS[garito_level]
+        diff = DIFFICULTY_SETTINGS[difficulty]
+        effects = passive_effects or {}
+
+        self.garito_level = garito_level
+        self.difficulty = difficulty
+        self.players = players
+        self.stand_on = min(stand_on, 21)
+        self.double_totals = np.array(sorted(double_totals), dtype=np.int64)
+        self.min_bet = garito.get("min_bet", CONFIG["minimum_bet"])
+        self.bet = bet or self.min_bet
+        if not self.min_bet <= self.bet <= garito.get("max_bet", CONFIG["maximum_bet"]):
+            raise ValueError(f"Apuesta fuera de los limites del garito: {self.bet}")
+        self.chips_to_advance = garito.get("chips_to_advance")
+
+        # Reglas del garito y la dificultad
+        self.widow_curse = has_rule(garito, "widow_curse")
+        self.devils_game = has_rule(garito, "devils_game")
+        self.stress_reduction_win = diff.get("stress_reduction_win", 5)
+        self.stress_gain_loss = diff.get("stress_gain_loss", 3)
+        self.cursed = effects.get("cursed_streak", 0) > 0
+        self.streak_on_push = bool(effects.get("streak_on_push", False))
+
+        # Tablas de pago: [racha 0..5] y [apuesta simple/doblada][racha 0..5]
+        levels = range(STREAK_LEVELS)
+        bonus = win_bonus(garito, effects)
+        self.bj_base = blackjack_base_payout(self.bet, effects)
+        self.bj_streak_bonus = np.array(
+            [int(self.bj_base * (streak_multiplier(diff, s, effects, is_blackjack=True) - 1)) if s >= 2 else 0 for s in levels],
+            dtype=np.int64,
+        )
+        self.win_base = np.array([int(stake * (1 + bonus)) for stake in (self.bet, 2 * self.bet)], dtype=np.int64)
+        self.win_streak_bonus = np.array(
+            [[int(base * (streak_multiplier(diff, s, effects) - 1)) if s >= 2 else 0 for s in levels] for base in self.win_base],
+            dtype=np.int64,
+        )
+
+        # Estado por jugador
+        self.chips = np.full(players, starting_chips or arrival_chips(garito_level, difficulty), dtype=np.int64)
+        self.stress = np.full(players, diff["starting_stress"], dtype=np.int64)
+        self.win_streak = np.zeros(players, dtype=np.int64)
+        self.max_win_streak = np.zeros(players, dtype=np.int64)
+        self.rounds_played = np.zeros(players, dtype=np.int64)
+        self.outcome = np.full(players, PLAYING, dtype=np.int8)
+
+        # Acumuladores por ronda jugada (retorno = ganancia neta / apuesta)
+        self.return_sum = 0.0
+        self.return_sq_sum = 0.0
+        self.result_counts = np.zeros(5, dtype=np.int64)
+        self.streak_counts = np.zeros(STREAK_LEVELS, dtype=np.int64)
+
+    @property
+    def active(self) -> np.ndarray:
+        return self.outcome == PLAYING
+
+    def play_round(self, cards) -> Dict[str, np.ndarray]:
+        """Play one round for every active player.
+
+        cards: a (players, MAX_ROUND_CARDS) array of rank indices dealt left
+        to right, or a numpy Generator to draw from an infinite shoe.
+        Returns per-player arrays of the round (result, chips, stress,
+        win_streak, cards_used); rows of inactive players are zero.
+        """
+        n = self.players
+        live = self.active
+        pos = np.zeros(n, dtype=np.int64)
+        chips_before = self.chips.copy()
+        result = np.zeros(n, dtype=np.int8)
+
+        p_hard = np.zeros(n, dtype=np.int64)
+        p_ace = np.zeros(n, dtype=bool)
+        d_hard = np.zeros(n, dtype=np.int64)
+        d_ace = np.zeros(n, dtype=bool)
+
+        def deal(hard, has_ace, mask):
+            # Solo las filas que piden carta: las colas de pedir/robar son cortas
+            rows = np.flatnonzero(mask)
+            if isinstance(cards, np.random.Generator):
+                ranks = cards.integers(0, len(RANKS), size=len(rows))
+            else:
+                ranks = cards[rows, pos[rows]]
+            hard[rows] += HARD_POINTS[ranks]
+            has_ace[rows] |= ranks == ACE
+            pos[rows] += 1
+
+        # place_bet + _deal_initial_cards (jugador, crupier, jugador, crupier)
+        stake = np.where(live, self.bet, 0)
+        self.chips -= stake
+        for hard, has_ace in ((p_hard, p_ace), (d_hard, d_ace), (p_hard, p_ace), (d_hard, d_ace)):
+            deal(hard, has_ace, live)
+        p_value = _hand_value(p_hard, p_ace)
+        d_value = _hand_value(d_hard, d_ace)
+        p_blackjack = live & (p_value == 21)
+        d_blackjack = live & (d_value == 21)
+
+        # Doble blackjack: empate sin devolver la apuesta (como el engine), o
+        # derrota con widow_curse
+        both = p_blackjack & d_blackjack
+        result[both] = LOSS if self.widow_curse else PUSH
+
+        natural = p_blackjack & ~d_blackjack
+        self.win_streak += natural
+        level = np.minimum(self.win_streak, STREAK_LEVELS - 1)
+        self.chips += np.where(natural, self.bet + self.bj_base + self.bj_streak_bonus[level], 0)
+        result[natural] = BLACKJACK
+
+        # Turno del jugador: doblar, o pedir mientras no llegue a stand_on
+        turn = live & ~p_blackjack
+        doubled = turn & np.isin(p_value, self.double_totals) & (self.chips >= self.bet)
+        self.chips -= np.where(doubled, self.bet, 0)
+        stake = np.where(doubled, 2 * self.bet, stake)
+        deal(p_hard, p_ace, doubled)
+
+        hitting = turn & ~doubled & (p_value < self.stand_on)
+        while hitting.any():
+            deal(p_hard, p_ace, hitting)
+            hitting &= _hand_value(p_hard, p_ace) < self.stand_on
+        p_value = _hand_value(p_hard, p_ace)
+        busted = turn & (p_value > 21)
+        result[busted] = LOSS
+
+        # _dealer_play
+        dealer = turn & ~busted
+        drawing = dealer & (d_value < CONFIG["dealer_stand_value"])
+        while drawing.any():
+            deal(d_hard, d_ace, drawing)
+            drawing &= _hand_value(d_hard, d_ace) < CONFIG["dealer_stand_value"]
+        d_value = _hand_value(d_hard, d_ace)
+
+        # _resolve_round
+        if self.devils_game:
+            devil = dealer & d_blackjack
+            self.chips[devil] = 0
+            result[devil] = LOSS
+            dealer &= ~devil
+
+        won = dealer & ((d_value > 21) | (p_value > d_value))
+        self.win_streak += won
+        level = np.minimum(self.win_streak, STREAK_LEVELS - 1)
+        stake_kind = (stake == 2 * self.bet).astype(np.int64)
+        payout = stake + self.win_base[stake_kind] + self.win_streak_bonus[stake_kind, level]
+        self.chips += np.where(won, payout, 0)
+        result[won] = WIN
+
+        lost = dealer & ~won & (p_value < d_value)
+        result[lost] = LOSS
+
+        tied = dealer & ~won & ~lost
+        if self.widow_curse:
+            result[tied] = LOSS
+        else:
+            if not self.streak_on_push:
+                self.win_streak[tied] = 0
+            self.chips += np.where(tied, stake, 0)
+            result[tied] = PUSH
+
+        # _end_round: estrés, racha y fin de partida
+        winners = (result == WIN) | (result == BLACKJACK)
+        losers = result == LOSS
+        self.stress = np.where(winners, np.maximum(0, self.stress - self.stress_reduction_win), self.stress)
+        if self.cursed:
+            self.stress = np.where(winners, np.minimum(CONFIG["max_stress"], self.stress + 5), self.stress)
+        self.stress = np.where(losers, np.minimum(CONFIG["max_stress"], self.stress + self.stress_gain_loss), self.stress)
+        self.win_streak[losers] = 0
+        self.max_win_streak = np.maximum(self.max_win_streak, self.win_streak)
+
+        broke = live & ((self.chips <= 0) | (self.chips < self.min_bet) | (self.chips < self.bet))
+        collapsed = live & ~broke & (self.stress >= CONFIG["max_stress"])
+        self.outcome[broke] = BROKE
+        self.outcome[collapsed] = COLLAPSED
+        if self.chips_to_advance:
+            self.outcome[live & ~broke & ~collapsed & (self.chips >= self.chips_to_advance)] = ADVANCED
+
+        # Estadísticas
+        returns = (self.chips - chips_before)[live] / self.bet
+        self.return_sum += float(returns.sum())
+        self.return_sq_sum += float((returns * returns).sum())
+        self.rounds_played += live
+        self.result_counts += np.bincount(result[live], minlength=5)
+        self.streak_counts += np.bincount(np.minimum(self.win_streak[live], STREAK_LEVELS - 1), minlength=STREAK_LEVELS)
+
+        return {
+            "result": result,
+            "chips": np.where(live, self.chips, 0),
+            "stress": np.where(live, self.stress, 0),
+            "win_streak": np.where(live, self.win_streak, 0),
+            "cards_used": pos,
+        }
+
+    def summary(self) -> Dict:
+        rounds = int(self.rounds_played.sum())
+        mean = self.return_sum / rounds if rounds else 0.0
+        variance = self.return_sq_sum / rounds - mean * mean if rounds else 0.0
+        advanced = self.outcome == ADVANCED
+        return {
+            "garito": self.garito_level,
+            "difficulty": self.difficulty,
+            "players": self.players,
+            "rounds": rounds,
+            "bet": self.bet,
+            "house_edge": -mean,
+            "return_variance": variance,
+            "results": {
+                name: int(self.result_counts[code]) / rounds if rounds else 0.0
+                for name, code in RESULT_CODES.items()
+            },
+            "streak_distribution": {
+                (f"{level}+" if level == STREAK_LEVELS - 1 else str(level)): int(count) / rounds if rounds else 0.0
+                for level, count in enumerate(self.streak_counts)
+            },
+            "max_streak_mean": float(self.max_win_streak.mean()),
+            "advance_rate": float(advanced.mean()),
+            "broke_rate": float((self.outcome == BROKE).mean()),
+            "collapse_rate": float((self.outcome == COLLAPSED).mean()),
+            "rounds_to_advance": float(self.rounds_played[advanced].mean()) if advanced.any() else None,
+        }
+
+
+def simulate(
+    garito_level: int,
+    difficulty: str,
+    players: int = 20000,
+    rounds: int = 200,
+    seed: Optional[int] = None,
+    **options,
+) -> Dict:
+    """Run `rounds` rounds (or until every player is done) with an infinite shoe"""
+    rng = np.random.default_rng(seed)
+    sim = RoundSimulator(garito_level, difficulty, players, **options)
+    for _ in range(rounds):
+        if not sim.active.any():
+            break
+        sim.play_round(rng)
+    return sim.summary()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CROSS-CHECK CONTRA Game
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _engine_action(game: Game, stand_on: int, double_totals: Iterable[int]) -> PlayerAction:
+    """La misma estrategia fija del simulador, decidida sobre un Game"""
+    value = game.player_hand.calculate_value()
+    if game.player_hand.can_double() and value in double_totals and game.player_chips >= game.current_bet:
+        return PlayerAction.DOUBLE
+    if value < stand_on:
+        return PlayerAction.HIT
+    return PlayerAction.STAND
+
+
+def cross_check(
+    garito_level: int,
+    difficulty: str,
+    players: int = 300,
+    rounds: int = 80,
+    seed: int = 0,
+    items: Iterable[str] = (),
+    stand_on: int = 17,
+    double_totals: Iterable[int] = (10, 11),
+) -> List[str]:
+    """Play real Games, replay their cards through the simulator and return
+    every disagreement (an empty list means the two are in sync)"""
+    items = list(items)
+    double_totals = tuple(double_totals)
+    random.seed(seed)
+
+    # 1. Partidas reales, registrando las cartas repartidas en cada ronda
+    cards = np.zeros((players, rounds, MAX_ROUND_CARDS), dtype=np.int64)
+    expected: List[List[Dict]] = []
+    bet = GARITOS[garito_level].get("min_bet", CONFIG["minimum_bet"])
+    for player in range(players):
+        game = Game(f"sim{player}", "Simulador", difficulty)
+        game.current_garito = garito_level
+        game.player_chips = arrival_chips(garito_level, difficulty)
+        for item_id in items:
+            game.inventory.add_item(item_id)
+
+        dealt: List[int] = []
+        deal = game.deck.deal
+
+        def recording_deal(deal=deal, dealt=dealt):
+            card = deal()
+            dealt.append(RANKS.index(card.rank))
+            return card
+
+        game.deck.deal = recording_deal
+
+        history = []
+        for round_no in range(rounds):
+            dealt.clear()
+            game.place_bet(bet)
+            while game.status == GameStatus.PLAYER_TURN:
+                game.player_action(_engine_action(game, stand_on, double_totals))
+            cards[player, round_no, :len(dealt)] = dealt
+            history.append({
+                "result": RESULT_CODES[game.round_result],
+                "chips": game.player_chips,
+                "stress": game.stress,
+                "win_streak": game.win_streak,
+                "cards_used": len(dealt),
+            })
+            if game.status == GameStatus.GAME_OVER or game.new_round()["can_advance_garito"]:
+                break
+        expected.append(history)
+
+    # 2. Las mismas cartas por el simulador
+    sim = RoundSimulator(
+        garito_level, difficulty, players,
+        passive_effects=passive_effects_for(items), stand_on=stand_on, double_totals=double_totals, bet=bet,
+    )
+    errors = []
+    for round_no in range(rounds):
+        live = sim.active.copy()
+        trace = sim.play_round(cards[:, round_no, :])
+        for player in range(players):
+            history = expected[player]
+            played = round_no < len(history)
+            if played != live[player]:
+                errors.append(f"garito {garito_level} {difficulty} jugador {player} ronda {round_no}: "
+                              f"engine {'juega' if played else 'terminado'}, simulador al reves")
+                continue
+            if not played:
+                continue
+            for field, value in history[round_no].items():
+                if int(trace[field][player]) != value:
+                    errors.append(f"garito {garito_level} {difficulty} jugador {player} ronda {round_no}: "
+                                  f"{field} engine={value} simulador={int(trace[field][player])}")
+    return errors
+
+
+def _print_summary(summary: Dict):
+    streaks = " ".join(f"{level}:{share:.3f}" for level, share in summary["streak_distribution"].items())
+    to_advance = summary["rounds_to_advance"]
+    print(
+        f"garito {summary['garito']} {summary['difficulty']:<6} "
+        f"edge {summary['house_edge']*100:+7.2f}%  var {summary['return_variance']:6.2f}  "
+        f"adv {summary['advance_rate']*100:5.1f}%  broke {summary['broke_rate']*100:5.1f}%  "
+        f"collapse {summary['collapse_rate']*100:5.1f}%  "
+        f"rounds->adv {to_advance if to_advance is None else round(to_advance, 1)}  streaks {streaks}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulador de rondas para balancear garitos y dificultades")
+    parser.add_argument("--players", type=int, default=None)
+    parser.add_argument("--rounds", type=int, default=None)
+    parser.add_argument("--garito", type=int, choices=sorted(GARITOS), default=None)
+    parser.add_argument("--difficulty", choices=sorted(DIFFICULTY_SETTINGS), default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stand-on", type=int, default=17)
+    parser.add_argument("--double", type=int, nargs="*", default=[10, 11])
+    parser.add_argument("--item", action="append", default=[], help="objeto pasivo que lleva el jugador")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--cross-check", action="store_true", help="comprobar el simulador contra Game")
+    args = parser.parse_args()
+
+    garitos = [args.garito] if args.garito else sorted(GARITOS)
+    difficulties = [args.difficulty] if args.difficulty else list(DIFFICULTY_SETTINGS)
+
+    if args.cross_check:
+        failures = []
+        for level in garitos:
+            for difficulty in difficulties:
+                failures += cross_check(
+                    level, difficulty, players=args.players or 300, rounds=args.rounds or 80, seed=args.seed,
+                    items=args.item, stand_on=args.stand_on, double_totals=args.double,
+                )
+        for failure in failures[:20]:
+            print(failure)
+        print("cross-check OK" if not failures else f"cross-check FAILED: {len(failures)} diferencias")
+        raise SystemExit(1 if failures else 0)
+
+    results = []
+    start = time.perf_counter()
+    for level in garitos:
+        for difficulty in difficulties:
+            summary = simulate(
+                level, difficulty, players=args.players or 20000, rounds=args.rounds or 200, seed=args.seed,
+                passive_effects=passive_effects_for(args.item), stand_on=args.stand_on, double_totals=args.double,
+            )
+            results.append(summary)
+            if not args.json:
+                _print_summary(summary)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        total = sum(summary["rounds"] for summary in results)
+        print(f"{total} rondas en {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,89 @@
+"""
+Versioned game-state snapshots and JSON-Patch diffs for Blackjack Roguelite
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Get history configuration from environment variables
+STATE_HISTORY_GAMES = int(os.getenv("STATE_HISTORY_GAMES", "1024"))
+STATE_HISTORY_DEPTH = int(os.getenv("STATE_HISTORY_DEPTH", "4"))
+
+
+def _pointer(path: str, key: Any) -> str:
+    """Append a key to a JSON Pointer (RFC 6901 escaping)"""
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def json_diff(old: Any, new: Any, path: str = "") -> List[Dict]:
+    """RFC 6902 operations (add/remove/replace) turning old into new.
+
+    Dicts are diffed key by key and equal-length lists element by element;
+    a list that grew or shrank is replaced whole, which is what hands and
+    inventories do most of the time anyway.
+    """
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(path, key), "value": value})
+            else:
+                ops.extend(json_diff(old[key], value, _pointer(path, key)))
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer(path, key)})
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            ops.extend(json_diff(old_item, new_item, _pointer(path, index)))
+        return ops
+
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+class StateHistory:
+    """Last few to_dict() snapshots per game, keyed by state version.
+
+    Bounded twice: at most `depth` versions per game and at most
+    `max_games` games (least recently used first out). A miss simply means
+    the caller answers with the full state, so losing entries is harmless.
+    Snapshots are stored as-is and must not be mutated afterwards.
+    """
+
+    def __init__(self, max_games: int = 1024, depth: int = 4):
+        self.max_games = max_games
+        self.depth = depth
+        self._games: "OrderedDict[str, OrderedDict[int, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, game_id: str, version: int, state: Dict):
+        if self.max_games <= 0 or self.depth <= 0:
+            return
+
+        with self._lock:
+            versions = self._games.pop(game_id, None) or OrderedDict()
+            versions[version] = state
+            versions.move_to_end(version)
+            while len(versions) > self.depth:
+                versions.popitem(last=False)
+            self._games[game_id] = versions
+            while len(self._games) > self.max_games:
+                self._games.popitem(last=False)
+
+    def get(self, game_id: str, version: int) -> Optional[Dict]:
+        with self._lock:
+            versions = self._games.get(game_id)
+            return versions.get(version) if versions else None
+
+    def forget(self, game_id: str):
+        with self._lock:
+            self._games.pop(game_id, None)
+
+
+state_history = StateHistory(STATE_HISTORY_GAMES, STATE_HISTORY_DEPTH)
@@ -0,0 +1,237 @@
+"""
+Precomputed basic-strategy tables for Blackjack Roguelite.
+
+One table per garito answers HIT, STAND or DOUBLE for every
+(player total, soft, dealer upcard, can_double). Tables are computed
+offline from each garito's payout rules with an infinite-deck expected
+value and shipped in a small binary file that every worker memory-maps
+read-only, so all processes share the same pages.
+
+The rules that change a decision are the dealer stand value, the win
+bonus (drunk_bonus), pushes counting as losses (widow_curse) and the
+dealer's blackjack beating a player 21 (devils_game). devils_game
+actually costs every chip, which no per-hand table can price, so it is
+scored as losing the stake. high_roller has no effect on payouts in the
+engine yet, so its garito gets the plain table. Streaks and items are
+left out: the tables give the garito's basic strategy, not the best play
+for one run.
+
+File layout (big-endian):
+    header   → magic "BJST", version, stand value, garito count, fingerprint (8 bytes)
+    levels   → one byte per garito, in block order
+    blocks   → 22 totals x 2 (soft) x 10 upcards (2..11) x 2 (can_double), one byte per cell
+
+Usage:
+    python strategy.py            # regenerate strategy_tables.bin
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# Get strategy configuration from environment variables
+STRATEGY_TABLE_PATH = os.getenv(
+    "STRATEGY_TABLE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "strategy_tables.bin")
+)
+
+HIT, STAND, DOUBLE = 0, 1, 2
+ACTION_NAMES = ("hit", "stand", "double")
+
+TABLE_VERSION = 1
+_HEADER = struct.Struct(">4sBBB8s")
+_MAGIC = b"BJST"
+
+TOTALS = 22
+UPCARDS = tuple(range(2, 12))  # 11 = ace
+BLOCK_SIZE = TOTALS * 2 * len(UPCARDS) * 2
+
+# Infinite deck: every rank is 1/13, tens (10/J/Q/K) are 4/13
+DRAWS = tuple((p, (4 if p == 10 else 1) / 13) for p in UPCARDS)
+
+
+def garito_rules(garito: Dict, win_multiplier: float, stand_value: int) -> Tuple:
+    """Payout parameters that shape a garito's table:
+    (stand value, win multiplier, push is a loss, dealer BJ beats 21)"""
+    rules = garito.get("special_rules", [])
+    return (stand_value, round(float(win_multiplier), 6), "widow_curse" in rules, "devils_game" in rules)
+
+
+def fingerprint(rules_by_level: Dict[int, Tuple]) -> bytes:
+    """Digest of the inputs, so a stale file is rejected instead of misused"""
+    payload = json.dumps(sorted(rules_by_level.items()), separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).digest()[:8]
+
+
+def _cell(total: int, soft: bool, upcard: int, can_double: bool) -> int:
+    return ((total * 2 + soft) * len(UPCARDS) + (upcard - 2)) * 2 + can_double
+
+
+def _value(hard: int, has_ace: bool) -> int:
+    return hard + 10 if has_ace and hard + 10 <= 21 else hard
+
+
+def _add(hard: int, has_ace: bool, p: int) -> Tuple[int, bool]:
+    return hard + (1 if p == 11 else p), has_ace or p == 11
+
+
+def _dealer_distribution(upcard: int, stand_value: int) -> Tuple[Dict[int, float], float, float]:
+    """Infinite-deck dealer result for an upcard: ({total: p}, p(bust), p(blackjack)).
+    The dealer does not peek, so blackjacks are part of the distribution."""
+    totals: Dict[int, float] = {}
+    busts = 0.0
+    blackjack = 0.0
+
+    def play(hard: int, has_ace: bool, cards: int, p: float):
+        nonlocal busts, blackjack
+        value = _value(hard, has_ace)
+        if value > 21:
+            busts += p
+        elif value >= stand_value:
+            if value == 21 and cards == 2:
+                blackjack += p
+            else:
+                totals[value] = totals.get(value, 0.0) + p
+        else:
+            for draw, q in DRAWS:
+                play(*_add(hard, has_ace, draw), cards + 1, p * q)
+
+    play(*_add(0, False, upcard), 1, 1.0)
+    return totals, busts, blackjack
+
+
+def build_table(rules: Tuple) -> bytes:
+    """Best action for every cell of one garito's block"""
+    stand_value, win, push_loses, blackjack_beats_21 = rules
+    push = -1.0 if push_loses else 0.0
+    block = bytearray(BLOCK_SIZE)
+
+    for upcard in UPCARDS:
+        totals, busts, blackjack = _dealer_distribution(upcard, stand_value)
+
+        @lru_cache(maxsize=None)
+        def stand_ev(value: int) -> float:
+            ev = busts * win
+            for dealer, p in totals.items():
+                ev += p * (win if value > dealer else -1.0 if value < dealer else push)
+            # No peek: a dealer blackjack is compared as just another 21
+            if value < 21 or blackjack_beats_21:
+                ev -= blackjack
+            else:
+                ev += blackjack * push
+            return ev
+
+        @lru_cache(maxsize=None)
+        def hit_ev(hard: int, has_ace: bool) -> float:
+            ev = 0.0
+            for draw, q in DRAWS:
+                next_hard, next_ace = _add(hard, has_ace, draw)
+                value = _value(next_hard, next_ace)
+                if value > 21:
+                    ev -= q
+                elif value == 21:
+                    ev += q * stand_ev(21)  # the engine stands by itself on 21
+                else:
+                    ev += q * max(stand_ev(value), hit_ev(next_hard, next_ace))
+            return ev
+
+        def double_ev(hard: int, has_ace: bool) -> float:
+            ev = 0.0
+            for draw, q in DRAWS:
+                value = _value(*_add(hard, has_ace, draw))
+                ev += q * (-1.0 if value > 21 else stand_ev(value))
+            return 2 * ev
+
+        for total in range(TOTALS):
+            for soft in (False, True):
+                if soft and total < 12:
+                    continue  # impossible: a soft ace alone is already 11
+                hard, has_ace = (total - 10, True) if soft else (total, False)
+                stand, hit = stand_ev(total), hit_ev(hard, has_ace)
+                for can_double in (False, True):
+                    best, action = (stand, STAND) if stand >= hit else (hit, HIT)
+                    if can_double and double_ev(hard, has_ace) > best:
+                        action = DOUBLE
+                    block[_cell(total, soft, upcard, can_double)] = action
+    return bytes(block)
+
+
+def write_tables(path: str, rules_by_level: Dict[int, Tuple]):
+    levels = sorted(rules_by_level)
+    stand_values = {rules[0] for rules in rules_by_level.values()}
+    if len(stand_values) != 1:
+        raise ValueError("All garitos must share the dealer stand value")
+    with open(path + ".tmp", "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, TABLE_VERSION, stand_values.pop(), len(levels), fingerprint(rules_by_level)))
+        f.write(bytes(levels))
+        for level in levels:
+            f.write(build_table(rules_by_level[level]))
+    os.replace(path + ".tmp", path)
+
+
+class StrategyTables:
+    """Read-only, memory-mapped view of strategy_tables.bin"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._blocks: Dict[int, int] = {}
+        self.error: Optional[str] = "not loaded"
+
+    @property
+    def ready(self) -> bool:
+        return self._map is not None
+
+    def open(self, rules_by_level: Dict[int, Tuple]) -> bool:
+        """Map the file if it was generated for exactly these rules"""
+        self.close()
+        try:
+            with open(self.path, "rb") as f:
+                table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            return False
+
+        if len(table) >= _HEADER.size:
+            magic, version, _, count, digest = _HEADER.unpack_from(table)
+        else:
+            magic, version, count, digest = None, 0, 0, b""
+        expected_size = _HEADER.size + count + count * BLOCK_SIZE
+        if magic != _MAGIC or version != TABLE_VERSION or len(table) != expected_size:
+            self.error = "unknown or truncated file"
+        elif digest != fingerprint(rules_by_level):
+            self.error = "generated for other rules, run python strategy.py"
+        else:
+            levels = table[_HEADER.size:_HEADER.size + count]
+            base = _HEADER.size + count
+            self._blocks = {level: base + i * BLOCK_SIZE for i, level in enumerate(levels)}
+            self._map = table
+            self.error = None
+            return True
+        table.close()
+        return False
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = None
+        self._blocks = {}
+
+    def action(self, garito_level: int, total: int, soft: bool, upcard: int, can_double: bool) -> Optional[str]:
+        """Table action for a hand, or None if there is no table for the garito"""
+        offset = self._blocks.get(garito_level)
+        if self._map is None or offset is None or not 0 <= total < TOTALS:
+            return None
+        return ACTION_NAMES[self._map[offset + _cell(total, soft, upcard, can_double)]]
+
+
+strategy_tables = StrategyTables(STRATEGY_TABLE_PATH)
+
+
+if __name__ == "__main__":
+    from engine import GARITOS, strategy_rules
+
+    write_tables(STRATEGY_TABLE_PATH, strategy_rules())
+    print(f"Wrote {len(GARITOS)} strategy tables to {STRATEGY_TABLE_PATH}")
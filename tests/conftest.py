@@ -0,0 +1,111 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database, driven in-process
+through httpx's ASGITransport, with the games in the database or in a
+fakeredis session store.
+"""
+import os
+import tempfile
+
+# Throwaway SQLite database, set before main reads the configuration
+_db_path = os.path.join(tempfile.mkdtemp(prefix="bj-tests-"), "tests.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_path}"
+os.environ["GAME_STORE_BACKEND"] = "database"
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List
+
+import fakeredis
+import httpx
+import pytest
+
+import main
+from database import get_async_engine
+from game_cache import GameCache
+from game_store import RedisGameStore
+
+_worker: ContextVar[int] = ContextVar("test_worker", default=0)
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def app():
+    await main.startup_event()
+    yield main.app
+    await main.shutdown_event()
+    await get_async_engine().dispose()
+
+
+@pytest.fixture
+async def client(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_store(redis_server, monkeypatch):
+    """Games live in a fresh fakeredis store for this test"""
+    store = RedisGameStore(fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True))
+    monkeypatch.setattr(main, "game_store", store)
+    return store
+
+
+@pytest.fixture(params=["database", "redis"])
+def backend(request, monkeypatch):
+    """Run the test once with games in the database and once in Redis"""
+    if request.param == "redis":
+        return request.getfixturevalue("redis_store")
+    monkeypatch.setattr(main, "game_store", None)
+    return None
+
+
+@pytest.fixture(autouse=True)
+def empty_game_cache():
+    main.game_cache.clear()
+    yield
+    main.game_cache.clear()
+
+
+class PerWorker:
+    """Stands in for a per-process singleton: forwards to the instance of
+    the worker the current task runs as"""
+
+    def __init__(self, instances: List):
+        self.instances = instances
+
+    def __getattr__(self, name):
+        return getattr(self.instances[_worker.get()], name)
+
+
+class Workers:
+    """Several app workers in one process: each has its own game cache and,
+    with Redis, its own client of the shared server"""
+
+    @contextmanager
+    def worker(self, index: int):
+        token = _worker.set(index)
+        try:
+            yield
+        finally:
+            _worker.reset(token)
+
+
+@pytest.fixture
+def workers(request, backend, monkeypatch):
+    """Two workers sharing the database (and the Redis server, if any)"""
+    monkeypatch.setattr(main, "game_cache", PerWorker([GameCache(), GameCache()]))
+    if backend is not None:
+        server = request.getfixturevalue("redis_server")
+        other = RedisGameStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        monkeypatch.setattr(main, "game_store", PerWorker([backend, other]))
+    return Workers()
@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+import main
+from engine import Game, GameStatus
+from models import GameModel, LeaderboardModel
+
+pytestmark = pytest.mark.anyio
+
+CONCURRENT_REQUESTS = 40
+
+
+async def fresh_state(client, game_id):
+    """The state as stored, not as left in this process's cache"""
+    main.game_cache.clear()
+    return (await client.get(f"/games/{game_id}")).json()
+
+
+async def test_concurrent_cheats_keep_one_history(client, backend):
+    game_id = (await client.post("/games", json={"player_name": "Race"})).json()["game_id"]
+    start = (await client.post(f"/games/{game_id}/bet", json={"amount": 10})).json()
+
+    responses = await asyncio.gather(*(
+        client.post(f"/games/{game_id}/cheat", json={"cheat_id": cheat_id})
+        for cheat_id in ["peek_card", "peek_next_card"] * (CONCURRENT_REQUESTS // 2)
+    ))
+
+    assert {r.status_code for r in responses} <= {200, 409}
+    saved = [r.json() for r in responses if r.status_code == 200]
+    assert saved
+
+    final = await fresh_state(client, game_id)
+    # Ninguna trampa aplicada se perdió ni se contó dos veces
+    applied = [r for r in saved if "cheat_id" in r["cheat_result"]]
+    assert final["stats"]["cheats_used"] == start["stats"]["cheats_used"] + len(applied)
+    # Cada guardado sube la versión una vez, sin huecos ni repetidas (en la BD,
+    # una trampa rechazada no cambia nada y no llega a escribir)
+    writes = saved if backend else applied
+    assert final["version"] == start["version"] + len(writes)
+    assert sorted(r["game_state"]["version"] for r in writes) == list(range(start["version"] + 1, final["version"] + 1))
+
+    # El último guardado es exactamente lo que quedó: fichas, manos y mazo
+    last = max(saved, key=lambda r: r["game_state"]["version"])["game_state"]
+    for field in ("player_chips", "current_bet", "player_hand", "dealer_hand", "stress", "stats"):
+        assert final[field] == last[field]
+    cards = [card["id"] for hand in (final["player_hand"], final["dealer_hand"]) for card in hand["cards"]]
+    cards = [card for card in cards if card != "hidden"]
+    assert len(cards) == len(set(cards))
+    assert final["player_chips"] + final["current_bet"] <= start["player_chips"] + start["current_bet"]
+
+
+async def stale_copy(game_id) -> Game:
+    """A copy of the game as another worker would keep it in its cache"""
+    async with main.AsyncSessionLocal() as db:
+        return await main.load_game_from_db(game_id, db)
+
+
+async def test_stale_copy_does_not_revive_deleted_game(client, redis_store):
+    game_id = (await client.post("/games", json={"player_name": "Ghost"})).json()["game_id"]
+    await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+    game = await stale_copy(game_id)
+
+    assert (await client.delete(f"/games/{game_id}")).status_code == 200
+
+    game.player_chips += 1000
+    async with main.AsyncSessionLocal() as db:
+        with pytest.raises(main.GameConflictError):
+            await main.save_game_to_db(game, db)
+    assert await redis_store.load(game_id) is None
+    main.game_cache.clear()
+    assert (await client.get(f"/games/{game_id}")).status_code == 404
+
+
+async def test_stale_copy_after_idle_flush_conflicts(client, redis_store):
+    game_id = (await client.post("/games", json={"player_name": "Idle"})).json()["game_id"]
+    await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+    game = await stale_copy(game_id)
+
+    assert await main.flush_idle_games(-1) == 1
+    assert await redis_store.load(game_id) is None
+
+    # Cargada de nuevo de la BD, la partida vuelve al store sin conflicto
+    main.game_cache.clear()
+    response = await client.post(f"/games/{game_id}/cheat", json={"cheat_id": "peek_card"})
+    assert response.status_code == 200
+    state = response.json()["game_state"]
+
+    game.player_chips += 1000
+    async with main.AsyncSessionLocal() as db:
+        with pytest.raises(main.GameConflictError):
+            await main.save_game_to_db(game, db)
+    row, _ = await redis_store.load(game_id)
+    assert row["version"] == state["version"]
+    assert row["player_chips"] == state["player_chips"] < 1000
+
+
+async def test_flush_keeps_the_version_of_the_store(client, redis_store):
+    game_id = (await client.post("/games", json={"player_name": "Idle"})).json()["game_id"]
+    state = (await client.post(f"/games/{game_id}/bet", json={"amount": 10})).json()
+    game = await stale_copy(game_id)
+
+    assert await main.flush_idle_games(-1) == 1
+
+    # La copia de antes del volcado es la misma versión que quedó en la BD:
+    # seguir con ella es legítimo, una sola vez
+    game.player_chips -= 5
+    async with main.AsyncSessionLocal() as db:
+        await main.save_game_to_db(game, db)
+        assert await db.scalar(select(GameModel.version).where(GameModel.id == game_id)) == state["version"]
+    row, _ = await redis_store.load(game_id)
+    assert row["version"] == state["version"] + 1
+
+
+async def test_two_workers_finishing_the_same_round(client, workers, backend):
+    with workers.worker(0):
+        game_id = (await client.post("/games", json={"player_name": "Finish"})).json()["game_id"]
+        await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+    copies = []
+    for index in (0, 1):
+        with workers.worker(index):
+            copies.append(await stale_copy(game_id))
+    version = copies[0].version
+
+    async def finish(index, chips):
+        with workers.worker(index):
+            game = copies[index]
+            game.player_chips = chips
+            game.status = GameStatus.GAME_OVER
+            async with main.AsyncSessionLocal() as db:
+                try:
+                    await main.save_game_to_db(game, db)
+                except main.GameConflictError:
+                    return None
+            return chips
+
+    results = await asyncio.gather(finish(0, 1), finish(1, 2))
+
+    # Solo una de las dos rondas terminadas cuenta, y es la que quedó en la BD
+    winners = [chips for chips in results if chips is not None]
+    assert len(winners) == 1
+    async with main.AsyncSessionLocal() as db:
+        db_game = await main._get_db_game(game_id, db)
+        assert db_game.version == version + 1
+        assert db_game.player_chips == winners[0]
+        assert db_game.status == GameStatus.GAME_OVER.value
+    if backend:
+        assert await backend.load(game_id) is None
+
+
+async def test_two_workers_deleting_the_same_game(client, workers, backend):
+    player_name = f"Leaver-{id(workers)}"
+    with workers.worker(0):
+        game_id = (await client.post("/games", json={"player_name": player_name})).json()["game_id"]
+        await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+    for index in (0, 1):
+        with workers.worker(index):
+            await client.get(f"/games/{game_id}")
+
+    async def leave(index):
+        with workers.worker(index):
+            return (await client.delete(f"/games/{game_id}")).status_code
+
+    assert sorted(await asyncio.gather(leave(0), leave(1))) == [200, 404]
+    async with main.AsyncSessionLocal() as db:
+        entries = await db.scalar(
+            select(func.count()).select_from(LeaderboardModel).where(LeaderboardModel.player_name == player_name)
+        )
+        assert entries == 1
+        assert await main._get_db_game(game_id, db) is None
+    if backend:
+        assert await backend.load(game_id) is None
@@ -0,0 +1,113 @@
+import json
+import random
+
+import pytest
+
+from engine import ITEMS, TRAMPAS, GAME_COLUMNS, Game, GameStatus, PlayerAction
+from models import GameModel, StatsModel
+
+
+def snapshot(game: Game):
+    # Copia congelada: las manos, el inventario y las listas se mutan in situ
+    return json.loads(json.dumps(game.to_db_model())), game.stats_dict()
+
+
+def random_action(game: Game, rng: random.Random):
+    if game.status == GameStatus.WAITING_FOR_BET:
+        if rng.random() < 0.2 and game.inventory.items:
+            return lambda: game.use_item(rng.choice(list(game.inventory.items)))
+        return lambda: game.place_bet(game.get_garito().get("min_bet", 10))
+    if game.status == GameStatus.PLAYER_TURN:
+        choice = rng.random()
+        if choice < 0.3:
+            return lambda: game.attempt_cheat(rng.choice(list(TRAMPAS)))
+        if choice < 0.4 and game.inventory.items:
+            return lambda: game.use_item(rng.choice(list(game.inventory.items)))
+        return lambda: game.player_action(rng.choice(list(PlayerAction)))
+    if game.status == GameStatus.SHOP:
+        if rng.random() < 0.6:
+            return lambda: game.buy_item(rng.choice(list(ITEMS)))
+        return game.leave_shop
+    if game.check_garito_advancement() and rng.random() < 0.5:
+        return game.advance_garito
+    return game.new_round
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_tracked_columns_cover_every_change(seed):
+    rng = random.Random(seed)
+    random.seed(seed)
+    game = Game("dirty", "Tracker", rng.choice(["easy", "normal", "hard"]))
+    game.player_chips = 3000
+    game.mark_clean()
+    tracked_sizes = []
+
+    for _ in range(300):
+        if game.status == GameStatus.GAME_OVER:
+            break
+        before_row, before_stats = snapshot(game)
+        try:
+            random_action(game, rng)()
+        except ValueError:
+            pass
+        after_row, after_stats = snapshot(game)
+
+        changed = {column for column in GAME_COLUMNS if before_row[column] != after_row[column]}
+        dirty = game.dirty_fields()
+        assert changed <= set(dirty)
+        for column, value in dirty.items():
+            assert json.loads(json.dumps(value)) == after_row[column]
+        changed_stats = {column for column in after_stats if before_stats[column] != after_stats[column]}
+        assert changed_stats <= set(game.dirty_stats())
+
+        tracked_sizes.append(len(dirty))
+        game.mark_clean()
+        assert game.dirty_fields() == {}
+        assert game.dirty_stats() == {}
+
+    # Solo lo tocado: ni de lejos todas las columnas en cada acción
+    assert sum(tracked_sizes) / len(tracked_sizes) < len(GAME_COLUMNS) / 2
+
+
+def test_game_columns_match_the_db_row():
+    # to_db_model() escribe las columnas de corrido: no puede haber una sin seguimiento
+    assert set(Game("dirty", "Tracker").to_db_model()) == {"id", "version", *GAME_COLUMNS}
+
+
+def test_restored_game_is_dirty_until_marked_clean():
+    game = Game("dirty", "Tracker")
+    game.place_bet(10)
+    restored = Game.from_db_model(GameModel(**game.to_db_model()), StatsModel(**game.stats_dict()))
+
+    assert restored.dirty_fields() == {key: value for key, value in game.to_db_model().items() if key in GAME_COLUMNS}
+    restored.mark_clean()
+    assert restored.dirty_fields() == {}
+
+
+@pytest.mark.parametrize("dialect, statements", [("mysql", 1), ("mariadb", 1), ("sqlite", 2)])
+def test_stats_changes_share_the_round_trip_where_supported(dialect, statements):
+    import main
+    from sqlalchemy.dialects import mysql
+
+    game = Game("dirty", "Tracker")
+    game.mark_clean()
+    game.place_bet(10)
+    game.wins += 1
+
+    updates = main._targeted_update(game, game.dirty_fields(), game.dirty_stats(), dialect)
+    assert len(updates) == statements
+    if statements == 1:
+        sql = str(updates[0].compile(dialect=mysql.dialect()))
+        assert sql.startswith("UPDATE games, game_stats SET")
+        assert "game_stats.wins=" in sql and "games.version = " in sql
+
+
+def test_only_dirty_columns_are_written():
+    import main
+
+    game = Game("dirty", "Tracker")
+    game.mark_clean()
+    game.stress += 5
+
+    (statement,) = main._targeted_update(game, game.dirty_fields(), game.dirty_stats(), "sqlite")
+    assert set(statement.compile().params) == {"stress", "version", "id_1", "version_1"}
@@ -0,0 +1,39 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_copy_is_dropped_after_another_worker_saves(client, workers, backend):
+    with workers.worker(0):
+        game_id = (await client.post("/games", json={"player_name": "Cache"})).json()["game_id"]
+        cached = (await client.get(f"/games/{game_id}")).json()
+        assert cached["status"] == "waiting_for_bet"
+
+    with workers.worker(1):
+        moved = (await client.post(f"/games/{game_id}/bet", json={"amount": 10})).json()
+        assert moved["version"] > cached["version"]
+
+    with workers.worker(0):
+        response = await client.get(f"/games/{game_id}")
+        assert response.json()["version"] == moved["version"]
+        assert response.json()["status"] == moved["status"]
+
+        # Copia al día: se sirve de la caché tras comprobar solo la versión
+        response = await client.get(f"/games/{game_id}")
+        assert response.json()["version"] == moved["version"]
+        assert int(response.headers["x-db-queries"]) == (0 if backend else 1)
+
+
+async def test_stale_copy_is_not_used_for_a_mutation(client, workers):
+    with workers.worker(0):
+        game_id = (await client.post("/games", json={"player_name": "Cache"})).json()["game_id"]
+        await client.get(f"/games/{game_id}")
+
+    with workers.worker(1):
+        moved = (await client.post(f"/games/{game_id}/bet", json={"amount": 10})).json()
+
+    with workers.worker(0):
+        # La copia cacheada aún espera apuesta: con ella esta petición se aceptaría
+        response = await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+        assert response.status_code == 400
+        assert (await client.get(f"/games/{game_id}")).json()["version"] == moved["version"]
@@ -0,0 +1,153 @@
+import fakeredis
+import pytest
+from sqlalchemy import select
+
+import main
+from engine import Game, GameStatus
+from game_store import ACTIVE_GAMES_KEY, RedisGameStore
+from models import GameModel, LeaderboardModel, StatsModel
+
+pytestmark = pytest.mark.anyio
+
+
+def new_game() -> Game:
+    game = Game("store-test", "Tester", "normal")
+    game.place_bet(10)
+    return game
+
+
+@pytest.fixture
+def store():
+    return RedisGameStore(fakeredis.FakeAsyncRedis(decode_responses=True), ttl=120)
+
+
+async def test_save_load_round_trip(store):
+    game = new_game()
+    await store.save(game.to_db_model(), game.stats_dict())
+
+    row, stats = await store.load(game.id)
+    assert row == game.to_db_model()
+    assert stats == game.stats_dict()
+    restored = Game.from_db_model(GameModel(**row), StatsModel(**stats))
+    assert restored.to_dict() == game.to_dict()
+
+
+async def test_load_missing_game(store):
+    assert await store.load("nope") is None
+
+
+async def test_save_refreshes_ttl_and_activity(store):
+    game = new_game()
+    await store.save(game.to_db_model(), game.stats_dict())
+
+    assert 0 < await store.client.ttl(store._key(game.id)) <= 120
+    assert await store.client.zscore(ACTIVE_GAMES_KEY, game.id) is not None
+    assert await store.idle_game_ids(-1) == [game.id]
+    assert await store.idle_game_ids(3600) == []
+
+
+async def test_save_compare_and_swap(store):
+    game = new_game()
+    await store.save(game.to_db_model(), game.stats_dict())
+
+    game.version += 1
+    assert await store.save(game.to_db_model(), game.stats_dict(), expected_version=game.version - 1)
+    # Otra petición guardó desde que se cargó la versión 0
+    assert not await store.save(game.to_db_model(), game.stats_dict(), expected_version=0)
+    row, _ = await store.load(game.id)
+    assert row["version"] == game.version
+
+
+async def test_delete(store):
+    game = new_game()
+    await store.save(game.to_db_model(), game.stats_dict())
+    await store.delete(game.id)
+
+    assert await store.load(game.id) is None
+    assert await store.client.zscore(ACTIVE_GAMES_KEY, game.id) is None
+
+
+async def test_delete_if_version(store):
+    game = new_game()
+    await store.save(game.to_db_model(), game.stats_dict())
+
+    assert await store.delete(game.id, expected_version=game.version + 1) is False
+    assert await store.load(game.id) is not None
+    assert await store.delete(game.id, expected_version=game.version) is True
+    assert await store.load(game.id) is None
+    assert await store.idle_game_ids(-1) == []
+    assert await store.delete(game.id, expected_version=game.version) is None
+
+
+async def test_delete_loses_to_a_concurrent_save(monkeypatch):
+    server = fakeredis.FakeServer()
+    store = RedisGameStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    other = RedisGameStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    game = new_game()
+    await store.save(game.to_db_model(), game.stats_dict())
+    expected = game.version
+    game.version += 1
+    real_pipeline = store.client.pipeline
+
+    def pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        real_hget = pipe.hget
+
+        async def hget(key, field):
+            value = await real_hget(key, field)
+            # Otra petición guarda la partida entre el WATCH y el EXEC
+            await other.save(game.to_db_model(), game.stats_dict())
+            return value
+
+        pipe.hget = hget
+        return pipe
+
+    monkeypatch.setattr(store.client, "pipeline", pipeline)
+
+    assert await store.delete(game.id, expected_version=expected) is False
+    row, _ = await other.load(game.id)
+    assert row["version"] == game.version
+
+
+async def test_flush_idle_games_writes_to_db(client, redis_store):
+    game_id = (await client.post("/games", json={"player_name": "Idle"})).json()["game_id"]
+    await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+
+    assert await main.flush_idle_games(-1) == 1
+    assert await redis_store.load(game_id) is None
+    async with main.AsyncSessionLocal() as db:
+        db_game = await main._get_db_game(game_id, db)
+        assert db_game.current_bet == 10
+
+    main.game_cache.clear()
+    state = (await client.get(f"/games/{game_id}")).json()
+    assert state["current_bet"] == 10
+
+
+async def test_game_over_writes_through_to_db(client, redis_store):
+    game_id = (await client.post("/games", json={"player_name": "Broke"})).json()["game_id"]
+    assert await redis_store.load(game_id) is not None
+
+    async with main.AsyncSessionLocal() as db:
+        game = await main.load_game_from_db(game_id, db)
+        game.status = GameStatus.GAME_OVER
+        await main.save_game_to_db(game, db)
+
+    assert await redis_store.load(game_id) is None
+    async with main.AsyncSessionLocal() as db:
+        db_game = await main._get_db_game(game_id, db)
+        assert db_game.status == GameStatus.GAME_OVER.value
+
+
+async def test_delete_writes_through_to_db(client, redis_store):
+    game_id = (await client.post("/games", json={"player_name": "Leaver"})).json()["game_id"]
+    await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+
+    response = await client.delete(f"/games/{game_id}")
+    assert response.status_code == 200
+    assert response.json()["final_stats"]["player_name"] == "Leaver"
+    assert await redis_store.load(game_id) is None
+    async with main.AsyncSessionLocal() as db:
+        assert await main._get_db_game(game_id, db) is None
+        entries = await db.scalars(select(LeaderboardModel).where(LeaderboardModel.player_name == "Leaver"))
+        assert len(entries.all()) == 1
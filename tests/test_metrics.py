@@ -0,0 +1,32 @@
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from database import TimedQueuePool
+from metrics import instrument_pool
+
+
+def wait_count() -> float:
+    return REGISTRY.get_sample_value("db_pool_wait_seconds_count") or 0.0
+
+
+def test_pool_metrics_survive_pool_recreation(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1)
+    instrument_pool(engine)
+    instrument_pool(engine)
+    before = wait_count()
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert REGISTRY.get_sample_value("db_pool_checked_out") == 1
+    assert REGISTRY.get_sample_value("db_pool_checked_out") == 0
+    # Una espera por préstamo, aunque se instrumente dos veces
+    assert wait_count() == before + 1
+
+    # dispose() crea un pool nuevo: la clase y los eventos siguen ahí
+    engine.dispose()
+    assert isinstance(engine.pool, TimedQueuePool)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert REGISTRY.get_sample_value("db_pool_checked_out") == 1
+    assert wait_count() == before + 2
+    engine.dispose()
@@ -0,0 +1,95 @@
+import pytest
+
+import main
+import query_stats
+from query_stats import QueryBudgetExceeded, assert_query_budget
+
+pytestmark = pytest.mark.anyio
+
+# Una petición por ruta con presupuesto: (método, ruta, cuerpo JSON)
+BUDGETED_CALLS = {
+    "POST /games": ("POST", "/games", {"player_name": "Budget"}),
+    "GET /games/{game_id}": ("GET", "/games/{game_id}", None),
+    "GET /games/{game_id}/odds": ("GET", "/games/{game_id}/odds", None),
+    "GET /games/{game_id}/hint": ("GET", "/games/{game_id}/hint", None),
+    "POST /games/{game_id}/bet": ("POST", "/games/{game_id}/bet", {"amount": 10}),
+    "POST /games/{game_id}/action": ("POST", "/games/{game_id}/action", {"action": "stand"}),
+    "POST /games/{game_id}/cheat": ("POST", "/games/{game_id}/cheat", {"cheat_id": "peek_card"}),
+    "POST /games/{game_id}/use-item": ("POST", "/games/{game_id}/use-item", {"item_id": "whiskey"}),
+    "POST /games/{game_id}/buy-item": ("POST", "/games/{game_id}/buy-item", {"item_id": "whiskey"}),
+    "POST /games/{game_id}/advance-garito": ("POST", "/games/{game_id}/advance-garito", None),
+    "POST /games/{game_id}/leave-shop": ("POST", "/games/{game_id}/leave-shop", None),
+    "POST /games/{game_id}/new-round": ("POST", "/games/{game_id}/new-round", None),
+    "DELETE /games/{game_id}": ("DELETE", "/games/{game_id}", None),
+    "GET /leaderboard": ("GET", "/leaderboard", None),
+    "GET /health": ("GET", "/health", None),
+}
+
+
+@pytest.fixture
+def strict_budgets(monkeypatch, backend):
+    # Los presupuestos valen con la BD y con Redis como almacén: se prueban los dos
+    monkeypatch.setattr(query_stats, "QUERY_BUDGET_STRICT", True)
+
+
+def test_every_budgeted_route_is_covered():
+    assert set(BUDGETED_CALLS) == set(main.QUERY_BUDGETS)
+
+
+@pytest.mark.parametrize("state", ["cold", "warm", "flushed"])
+@pytest.mark.parametrize("endpoint", sorted(BUDGETED_CALLS))
+async def test_route_within_query_budget(client, strict_budgets, endpoint, state):
+    game_id = (await client.post("/games", json={"player_name": "Budget"})).json()["game_id"]
+    await client.post(f"/games/{game_id}/bet", json={"amount": 10})
+    if state == "warm":
+        await client.get(f"/games/{game_id}")
+    else:
+        main.game_cache.clear()
+    if state == "flushed":
+        # Con Redis, la partida ya pasó del store a la BD por inactiva
+        await main.flush_idle_games(-1)
+
+    method, route, body = BUDGETED_CALLS[endpoint]
+    # Con QUERY_BUDGET_STRICT, pasarse del presupuesto lanza QueryBudgetExceeded aquí
+    response = await client.request(method, route.format(game_id=game_id), json=body)
+    assert response.status_code < 500
+    assert int(response.headers["x-db-queries"]) <= main.QUERY_BUDGETS[endpoint]
+
+
+async def test_strict_middleware_raises_over_budget(client, strict_budgets, monkeypatch):
+    monkeypatch.setitem(main.QUERY_BUDGETS, "GET /health", 0)
+    with pytest.raises(QueryBudgetExceeded, match="GET /health: 1 SQL statements, budget 0"):
+        await client.get("/health")
+
+
+async def test_assert_query_budget_raises_when_exceeded(client):
+    game_id = (await client.post("/games", json={"player_name": "Budget"})).json()["game_id"]
+    main.game_cache.clear()
+
+    with pytest.raises(QueryBudgetExceeded, match="carga en frio") as exceeded:
+        with assert_query_budget(0, "carga en frio"):
+            await client.get(f"/games/{game_id}")
+    assert "SELECT" in str(exceeded.value)
+
+    # En caché solo se comprueba la versión guardada
+    with assert_query_budget(1, "carga en caliente") as stats:
+        await client.get(f"/games/{game_id}")
+    assert stats.queries == 1
+
+
+def test_failed_statement_leaves_no_timing_behind():
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.exc import OperationalError
+
+    engine = create_engine("sqlite://")
+    query_stats.instrument_engine(engine)
+    with engine.connect() as conn, query_stats.count_queries() as stats:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+
+        # Las sentencias fallidas cuentan, pero no dejan su inicio en la conexión
+        assert conn.info["query_start"] == []
+        assert stats.queries == 4
+        assert stats.statements[0] == "SELECT * FROM no_such_table"
@@ -0,0 +1,19 @@
+import pytest
+
+from engine import DIFFICULTY_SETTINGS, GARITOS
+from simulator import cross_check
+
+
+@pytest.mark.parametrize("difficulty", sorted(DIFFICULTY_SETTINGS))
+@pytest.mark.parametrize("garito_level", sorted(GARITOS))
+def test_simulator_matches_game(garito_level, difficulty):
+    assert cross_check(garito_level, difficulty, players=20, rounds=20, seed=1) == []
+
+
+@pytest.mark.parametrize("items", [["anillo_sello"], ["herradura", "amuleto_diablo"], ["moneda_maldita"]])
+def test_simulator_matches_game_with_items(items):
+    assert cross_check(2, "normal", players=20, rounds=20, seed=1, items=items) == []
+
+
+def test_simulator_matches_game_with_other_strategy():
+    assert cross_check(1, "normal", players=20, rounds=20, seed=2, stand_on=15, double_totals=(9, 10, 11)) == []
@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+
+
+@pytest.fixture
+def ws_client(backend):
+    with TestClient(main.app) as client:
+        yield client
+
+
+def new_game(client) -> str:
+    return client.post("/games", json={"player_name": "Socket"}).json()["game_id"]
+
+
+def test_malformed_frame_keeps_the_socket_open(ws_client):
+    game_id = new_game(ws_client)
+    with ws_client.websocket_connect(f"/games/{game_id}/ws") as ws:
+        assert ws.receive_json()["type"] == "state"
+
+        ws.send_text("{not json")
+        reply = ws.receive_json()
+        assert reply["type"] == "error"
+
+        ws.send_json({"type": "state"})
+        assert ws.receive_json()["game_state"]["id"] == game_id
+
+
+def play_round(ws) -> dict:
+    """Bet and stand until the round ends; the last message received"""
+    ws.send_json({"type": "bet", "amount": 10})
+    reply = ws.receive_json()
+    while reply["type"] != "state_discarded" and reply["game_state"]["status"] == "player_turn":
+        ws.send_json({"type": "action", "action": "stand"})
+        reply = ws.receive_json()
+    return reply
+
+
+def test_conflicting_save_sends_the_reloaded_state(ws_client):
+    game_id = new_game(ws_client)
+    with ws_client.websocket_connect(f"/games/{game_id}/ws") as ws:
+        ws.receive_json()
+        # Una petición HTTP juega la partida mientras el canal la tiene en memoria
+        http_state = ws_client.post(f"/games/{game_id}/bet", json={"amount": 20}).json()
+
+        play_round(ws)
+        discarded = ws.receive_json()
+        assert discarded["type"] == "state_discarded"
+        assert discarded["game_state"]["version"] == http_state["version"]
+        assert discarded["game_state"]["current_bet"] == 20
+
+    assert ws_client.get(f"/games/{game_id}").json()["version"] == http_state["version"]
+
+
+def test_deleted_game_closes_the_socket(ws_client):
+    game_id = new_game(ws_client)
+    with ws_client.websocket_connect(f"/games/{game_id}/ws") as ws:
+        ws.receive_json()
+        assert ws_client.delete(f"/games/{game_id}").status_code == 200
+
+        play_round(ws)
+        discarded = ws.receive_json()
+        assert discarded == {"type": "state_discarded", "detail": discarded["detail"], "game_state": None}
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        assert closed.value.code == 4404
+
+    assert ws_client.get(f"/games/{game_id}").status_code == 404